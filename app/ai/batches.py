@@ -0,0 +1,81 @@
+"""
+Client for the Anthropic Message Batches API.
+
+The pinned anthropic SDK predates batch support, so this talks to the REST
+endpoints directly. Anything serving the same four endpoints can stand in
+for the API, e.g. the local fake in app.ai.fake_batches.
+"""
+import json
+import requests
+from typing import Any, Dict, Iterator, List, Optional
+from app.config import get_settings
+
+API_VERSION = "2023-06-01"
+
+# processing_status once no more results will be produced
+BATCH_ENDED = "ended"
+
+# How long to keep polling a canceled batch until it reports BATCH_ENDED
+CANCEL_WAIT_SECONDS = 60.0
+CANCEL_POLL_SECONDS = 2.0
+
+
+class MessageBatchClient:
+    """Submits, polls, cancels and reads message batches."""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = 30.0):
+        settings = get_settings()
+        self.base_url = (base_url or settings.anthropic_base_url).rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'x-api-key': api_key or settings.anthropic_api_key,
+            'anthropic-version': API_VERSION,
+            'content-type': 'application/json',
+        })
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/v1/messages/batches{path}"
+
+    def _json(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def create(self, batch_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Submit a batch. Each request is {"custom_id": str, "params": dict}
+        where params are the usual messages.create arguments.
+        """
+        return self._json('POST', self._url(''), json={'requests': batch_requests})
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        """Get a batch's processing_status and request_counts."""
+        return self._json('GET', self._url(f'/{batch_id}'))
+
+    def cancel(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Ask for a batch to stop. The batch reports "canceling" until it
+        ends; requests already processed keep their results.
+        """
+        return self._json('POST', self._url(f'/{batch_id}/cancel'))
+
+    def results(self, batch: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Stream the JSONL results of an ended batch."""
+        url = batch.get('results_url') or self._url(f"/{batch['id']}/results")
+        response = self.session.get(url, timeout=self.timeout, stream=True)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def result_text(result: Dict[str, Any]) -> Optional[str]:
+    """Text of a succeeded batch result, or None for errored/canceled/expired ones."""
+    outcome = result.get('result') or {}
+    if outcome.get('type') != 'succeeded':
+        return None
+    blocks = (outcome.get('message') or {}).get('content') or []
+    text = "".join(block.get('text', '') for block in blocks if block.get('type') == 'text').strip()
+    return text or None
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models import SummaryCache
+from app.stats import Counters
+
+
+CACHE_STAT_FIELDS = ('hits', 'misses', 'stores', 'evictions')
+
+
+@lru_cache()
+def get_summary_cache_stats() -> Counters:
+    """Get the process-wide summary cache counters."""
+    return Counters(CACHE_STAT_FIELDS)
+
+
+class SummaryStore:
+    """
+    Persistent summary cache shared by preview, send and scheduled digests.
+    Entries are keyed by the model and the exact prompt content, so a post
+    whose text or top comments change gets a fresh summary.
+    """
+
+    def __init__(self, db: Session, stats: Counters = None):
+        self.db = db
+        self.settings = get_settings()
+        self.stats = stats or get_summary_cache_stats()
+        # Pipeline workers share the session, which is not thread-safe
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, post_id: str, content: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, post_id, content):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _expiry_cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(hours=self.settings.summary_cache_ttl_hours)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a fresh cached summary and mark it as recently used."""
+        with self._lock:
+            entry = self.db.query(SummaryCache).filter(SummaryCache.cache_key == key).first()
+            if entry is None or entry.created_at < self._expiry_cutoff():
+                self.stats.incr('misses')
+                return None
+
+            entry.last_used_at = datetime.utcnow()
+            self.db.commit()
+            self.stats.incr('hits')
+            return entry.summary
+
+    def put(self, key: str, post_id: str, model: str, summary: str):
+        """Store a summary, replacing an expired entry under the same key."""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self.db.query(SummaryCache).filter(SummaryCache.cache_key == key).first()
+            if entry is None:
+                entry = SummaryCache(cache_key=key, post_id=post_id, model=model)
+                self.db.add(entry)
+            entry.summary = summary
+            entry.created_at = now
+            entry.last_used_at = now
+            self.db.commit()
+            self.stats.incr('stores')
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used past the size limit."""
+        with self._lock:
+            removed = self.db.execute(
+                delete(SummaryCache).where(SummaryCache.created_at < self._expiry_cutoff())
+            ).rowcount
+
+            overflow = self.db.scalar(select(func.count(SummaryCache.id))) - self.settings.summary_cache_max_entries
+            if overflow > 0:
+                stale_ids = select(SummaryCache.id).order_by(SummaryCache.last_used_at).limit(overflow)
+                removed += self.db.execute(
+                    delete(SummaryCache).where(SummaryCache.id.in_(stale_ids))
+                ).rowcount
+
+            self.db.commit()
+        if removed:
+            self.stats.incr('evictions', removed)
+        return removed
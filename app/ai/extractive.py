@@ -0,0 +1,92 @@
+"""
+Local extractive summaries, used when the LLM misses the digest deadline
+or fails. Sentences from the post body and top comments are ranked by
+word frequency and overlap with the title; no network access.
+"""
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+MARKDOWN_NOISE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)|https?://\S+|[*_>#`~]+')
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers him his how i if in into is it its itself
+just me more most my no nor not now of off on once only or other our out over own same
+she should so some such than that the their them then there these they this those
+through to too under until up very was we were what when where which while who whom why
+will with would you your yours im ive dont its thats
+""".split())
+
+MIN_WORDS = 5
+MAX_WORDS = 45
+
+# Sentences from the post body are preferred over comment sentences
+BODY_WEIGHT = 1.2
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in WORD_PATTERN.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+def _sentences(text: str) -> List[str]:
+    text = MARKDOWN_NOISE.sub(lambda m: m.group(1) or ' ', text or '')
+    sentences = []
+    for raw in SENTENCE_SPLIT.split(text):
+        sentence = ' '.join(raw.split())
+        count = len(sentence.split())
+        if count < MIN_WORDS:
+            continue
+        if count > MAX_WORDS:
+            sentence = ' '.join(sentence.split()[:MAX_WORDS]) + '…'
+        sentences.append(sentence)
+    return sentences
+
+
+def extractive_summary(title: str, selftext: str = '', comments: Iterable[str] = (),
+                       max_sentences: int = 2, max_chars: int = 400) -> str:
+    """
+    Pick the highest-scoring sentences, in their original order.
+    Falls back to the title when there is no usable text.
+    """
+    candidates: List[Tuple[int, float, str]] = []
+    for sentence in _sentences(selftext):
+        candidates.append((len(candidates), BODY_WEIGHT, sentence))
+    for rank, body in enumerate(comments):
+        # Higher-ranked comments count for more
+        for sentence in _sentences(body):
+            candidates.append((len(candidates), 1.0 / (1 + 0.2 * rank), sentence))
+
+    if not candidates:
+        return title
+
+    frequencies = Counter(w for _, _, sentence in candidates for w in set(_words(sentence)))
+    top = max(frequencies.values(), default=1)
+    title_words = set(_words(title))
+
+    scored = []
+    for position, weight, sentence in candidates:
+        words = _words(sentence)
+        if not words:
+            continue
+        relevance = sum(frequencies[w] / top for w in words) / math.sqrt(len(words))
+        overlap = len(title_words.intersection(words)) / len(title_words) if title_words else 0.0
+        scored.append((weight * (relevance + overlap), position, sentence))
+
+    chosen = []
+    used = 0
+    for _, position, sentence in sorted(scored, reverse=True):
+        if len(chosen) == max_sentences:
+            break
+        if used + len(sentence) > max_chars and chosen:
+            continue
+        chosen.append((position, sentence))
+        used += len(sentence) + 1
+
+    if not chosen:
+        return title
+    return ' '.join(sentence for _, sentence in sorted(chosen))
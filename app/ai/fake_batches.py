@@ -0,0 +1,216 @@
+"""
+Local stand-in for the Anthropic Messages and Message Batches APIs.
+
+Serves canned summaries so the scheduled batch path can be exercised
+without network access or cost:
+
+    python -m app.ai.fake_batches --port 8766 --completion-delay 5 --error-rate 0.1
+
+and point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8766.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def fake_message(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a Messages API response echoing the first line of the prompt."""
+    prompt = ""
+    for message in params.get('messages', []):
+        content = message.get('content')
+        prompt = content if isinstance(content, str) else ""
+    title = next((line for line in prompt.splitlines() if line.startswith('Title: ')), 'Title: post')
+    return {
+        'id': f"msg_{uuid.uuid4().hex[:24]}",
+        'type': 'message',
+        'role': 'assistant',
+        'model': params.get('model', ''),
+        'content': [{'type': 'text', 'text': f"Summary of {title[len('Title: '):]}."}],
+        'stop_reason': 'end_turn',
+        'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': 20},
+    }
+
+
+class FakeBatch:
+    """
+    One submitted batch. Each request finishes at its own time before
+    `ends_at`. A cancel reports "canceling" for `cancel_delay` seconds before
+    the batch ends; requests that finished before the cancel keep their results.
+    """
+
+    def __init__(self, batch_requests: List[Dict[str, Any]], ends_at: float, failed_ids: set,
+                 done_at: Dict[str, float], cancel_delay: float = 0.0):
+        self.id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        self.requests = batch_requests
+        self.created_at = time.time()
+        self.ends_at = ends_at
+        self.failed_ids = failed_ids
+        self.done_at = done_at
+        self.cancel_delay = cancel_delay
+        self.canceled_at: Optional[float] = None
+
+    def status(self) -> str:
+        now = time.time()
+        if self.canceled_at is not None:
+            return 'ended' if now >= self.canceled_at + self.cancel_delay else 'canceling'
+        return 'ended' if now >= self.ends_at else 'in_progress'
+
+    def results(self) -> List[Dict[str, Any]]:
+        rows = []
+        for request in self.requests:
+            custom_id = request['custom_id']
+            if self.canceled_at is not None and self.done_at[custom_id] > self.canceled_at:
+                result = {'type': 'canceled'}
+            elif custom_id in self.failed_ids:
+                result = {'type': 'errored', 'error': {'type': 'api_error', 'message': 'Injected failure'}}
+            else:
+                result = {'type': 'succeeded', 'message': fake_message(request.get('params', {}))}
+            rows.append({'custom_id': custom_id, 'result': result})
+        return rows
+
+    def to_json(self, base_url: str) -> Dict[str, Any]:
+        status = self.status()
+        counts = {'processing': 0, 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        if status == 'ended':
+            for row in self.results():
+                counts[row['result']['type']] += 1
+        else:
+            counts['processing'] = len(self.requests)
+        return {
+            'id': self.id,
+            'type': 'message_batch',
+            'processing_status': status,
+            'request_counts': counts,
+            'results_url': f"{base_url}/v1/messages/batches/{self.id}/results" if status == 'ended' else None,
+        }
+
+
+class FakeBatchServer(ThreadingHTTPServer):
+    """Keeps submitted batches in memory."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], completion_delay: float = 0.0,
+                 error_rate: float = 0.0, latency: float = 0.0, seed: Optional[int] = None,
+                 cancel_delay: float = 1.0):
+        super().__init__(address, FakeBatchHandler)
+        self.completion_delay = completion_delay
+        self.cancel_delay = cancel_delay
+        self.error_rate = error_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.batches: Dict[str, FakeBatch] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def submit(self, batch_requests: List[Dict[str, Any]]) -> FakeBatch:
+        with self._lock:
+            now = time.time()
+            failed = {r['custom_id'] for r in batch_requests if self.random.random() < self.error_rate}
+            done_at = {
+                r['custom_id']: now + self.random.uniform(0, self.completion_delay) for r in batch_requests
+            }
+            batch = FakeBatch(batch_requests, now + self.completion_delay, failed, done_at, self.cancel_delay)
+            self.batches[batch.id] = batch
+        return batch
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    """Routes Messages and Message Batches requests."""
+
+    server: FakeBatchServer
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _batch(self, batch_id: str) -> Optional[FakeBatch]:
+        with self.server._lock:
+            return self.server.batches.get(batch_id)
+
+    def do_POST(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['v1', 'messages']:
+            time.sleep(self.server.latency)
+            self._send(200, fake_message(self._read_json()))
+        elif parts == ['v1', 'messages', 'batches']:
+            batch = self.server.submit(self._read_json().get('requests', []))
+            self._send(200, batch.to_json(self.server.base_url))
+        elif len(parts) == 5 and parts[:3] == ['v1', 'messages', 'batches'] and parts[4] == 'cancel':
+            batch = self._batch(parts[3])
+            if batch is None:
+                self._send(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+                return
+            if batch.status() == 'in_progress':
+                batch.canceled_at = time.time()
+            self._send(200, batch.to_json(self.server.base_url))
+        else:
+            self._send(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) < 4 or parts[:3] != ['v1', 'messages', 'batches']:
+            self._send(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+            return
+
+        batch = self._batch(parts[3])
+        if batch is None:
+            self._send(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+        elif len(parts) == 4:
+            self._send(200, batch.to_json(self.server.base_url))
+        elif parts[4] == 'results' and batch.status() == 'ended':
+            body = "\n".join(json.dumps(row) for row in batch.results()).encode('utf-8')
+            self._send_raw(200, body, 'application/x-jsonl')
+        else:
+            self._send(400, {'type': 'error', 'error': {'type': 'invalid_request_error'}})
+
+    def _send(self, status: int, payload: Dict[str, Any]):
+        self._send_raw(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def _send_raw(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local fake of the Anthropic batch API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--completion-delay', type=float, default=0.0, help="Seconds before a batch ends")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of batch requests that error")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latency of direct /v1/messages calls")
+    parser.add_argument('--cancel-delay', type=float, default=1.0, help="Seconds a canceled batch stays canceling")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeBatchServer(
+        (args.host, args.port), completion_delay=args.completion_delay,
+        error_rate=args.error_rate, latency=args.latency, seed=args.seed,
+        cancel_delay=args.cancel_delay
+    )
+    print(f"Fake Anthropic API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Process-wide governor for Anthropic calls.
+
+Keeps the daily summarization burst inside provider limits:
+- AIMD concurrency: the in-flight limit grows by one per window of
+  successes and halves on 429/529 responses or timeouts
+- Retry-After is honored by pausing every caller, not just the one throttled
+- a tokens-per-minute budget is reserved before each call and settled
+  against the reported usage afterwards
+- a circuit breaker fails calls fast after repeated failures, then lets a
+  single trial call through once the cooldown has passed
+- calls skipped because the caller's deadline passed are neither failures
+  nor congestion
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import get_settings
+
+# 529 is Anthropic's "overloaded" status
+THROTTLE_STATUSES = {429, 529}
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the caller's deadline passes while waiting to call or retry."""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, 'status_code', None)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_timeout(error: Exception) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(error).__name__
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    # Connection errors and timeouts carry no status code
+    return _is_timeout(error) or 'Connection' in type(error).__name__
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, 'usage', None)
+    if usage is None:
+        return None
+    return (getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'output_tokens', 0) or 0)
+
+
+class LLMGovernor:
+    """Admission control, retries and metrics for LLM calls; safe to share across threads."""
+
+    def __init__(self, initial_limit: int, max_limit: int, tokens_per_minute: int = 0,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 breaker_failures: int = 5, breaker_cooldown: float = 60.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(max(1, initial_limit), self.max_limit))
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.token_budget = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._usage = deque()  # (timestamp, tokens) of settled calls in the last minute
+
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+        self._trial_in_flight = False
+
+        self._counts = {
+            'calls': 0, 'succeeded': 0, 'failed': 0, 'retried': 0, 'throttled': 0,
+            'timeouts': 0, 'rejected_open_circuit': 0, 'circuit_opens': 0, 'deadline_skipped': 0,
+        }
+        self.max_in_flight = 0
+        self.min_limit_seen = self.limit
+        self.peak_tokens_per_minute = 0
+        self.wait_seconds = 0.0
+
+    # Admission
+
+    def _refill(self, now: float):
+        if self.tokens_per_minute:
+            elapsed = now - self._last_refill
+            self.token_budget = min(float(self.tokens_per_minute),
+                                    self.token_budget + elapsed * self.tokens_per_minute / 60.0)
+        self._last_refill = now
+
+    def _circuit_state(self, now: float) -> str:
+        if self.consecutive_failures < self.breaker_failures:
+            return 'closed'
+        return 'open' if now < self.circuit_open_until else 'half_open'
+
+    def try_acquire(self, tokens: int) -> Tuple[bool, float, bool]:
+        """
+        Admit one call reserving `tokens`, or return how long to wait first.
+        The last value is True for the half-open circuit's trial call, which
+        must be released with trial=True. Raises CircuitOpenError while the
+        breaker is open.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._circuit_state(now)
+            if state == 'open' or (state == 'half_open' and self._trial_in_flight):
+                self._counts['rejected_open_circuit'] += 1
+                raise CircuitOpenError("Anthropic circuit breaker is open")
+
+            if now < self.paused_until:
+                return False, self.paused_until - now, False
+            if self.in_flight >= int(self.limit):
+                return False, 0.05, False
+
+            self._refill(now)
+            if self.tokens_per_minute:
+                tokens = min(tokens, self.tokens_per_minute)
+                if self.token_budget < tokens:
+                    return False, (tokens - self.token_budget) * 60.0 / self.tokens_per_minute, False
+
+            if self.tokens_per_minute:
+                self.token_budget -= tokens
+            trial = state == 'half_open'
+            if trial:
+                self._trial_in_flight = True
+            self.in_flight += 1
+            self._counts['calls'] += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True, 0.0, trial
+
+    def _release(self, reserved: int, used: Optional[int], error: Optional[Exception], trial: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if trial:
+                self._trial_in_flight = False
+
+            if isinstance(error, DeadlineExceededError):
+                # Never sent: refund the reservation and leave limit and breaker alone
+                if self.tokens_per_minute:
+                    self._refill(now)
+                    self.token_budget = min(float(self.tokens_per_minute),
+                                            self.token_budget + min(reserved, self.tokens_per_minute))
+                self._counts['deadline_skipped'] += 1
+                return
+
+            if self.tokens_per_minute:
+                # Settle the reservation against reported usage; over-use becomes debt
+                settled = used if used is not None else reserved
+                self._refill(now)
+                self.token_budget += min(reserved, self.tokens_per_minute) - settled
+            if used is not None:
+                self._usage.append((now, used))
+            while self._usage and self._usage[0][0] < now - 60:
+                self._usage.popleft()
+            self.peak_tokens_per_minute = max(self.peak_tokens_per_minute, sum(t for _, t in self._usage))
+
+            if error is None:
+                self._counts['succeeded'] += 1
+                self.consecutive_failures = 0
+                # Additive increase: about one slot per limit's worth of successes
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                return
+
+            self._counts['failed'] += 1
+            status = _status_code(error)
+            timed_out = _is_timeout(error)
+            if status in THROTTLE_STATUSES or timed_out:
+                # Multiplicative decrease on congestion signals
+                self.limit = max(1.0, self.limit / 2)
+                self.min_limit_seen = min(self.min_limit_seen, self.limit)
+                self._counts['throttled' if status in THROTTLE_STATUSES else 'timeouts'] += 1
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.breaker_failures:
+                if now >= self.circuit_open_until:
+                    self._counts['circuit_opens'] += 1
+                self.circuit_open_until = now + self.breaker_cooldown
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds += seconds
+
+    # Calls
+
+    def call(self, fn: Callable[[], Any], tokens: int, deadline: Optional[float] = None) -> Any:
+        """
+        Run `fn` under the governor, retrying throttling, overload and
+        transient errors with jittered backoff until `deadline` (monotonic).
+        """
+        attempt = 0
+        while True:
+            self._check_deadline(deadline)
+            admitted, wait, trial = self.try_acquire(tokens)
+            if not admitted:
+                self._sleep(wait, deadline)
+                continue
+
+            try:
+                result = fn()
+            except Exception as e:
+                self._release(tokens, None, e, trial)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._counts_incr('retried')
+                self._sleep(self._backoff_delay(attempt, e), deadline, error=e)
+                attempt += 1
+                continue
+
+            self._release(tokens, _usage_tokens(result), None, trial)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int, deadline: Optional[float] = None) -> Any:
+        """Async variant of call(); `fn` returns a fresh awaitable per attempt."""
+        attempt = 0
+        while True:
+            self._check_deadline(deadline)
+            admitted, wait, trial = self.try_acquire(tokens)
+            if not admitted:
+                await asyncio.sleep(self._bounded_wait(wait, deadline))
+                continue
+
+            try:
+                result = await fn()
+            except Exception as e:
+                self._release(tokens, None, e, trial)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._counts_incr('retried')
+                await asyncio.sleep(self._bounded_wait(self._backoff_delay(attempt, e), deadline, error=e))
+                attempt += 1
+                continue
+
+            self._release(tokens, _usage_tokens(result), None, trial)
+            return result
+
+    def _counts_incr(self, field: str):
+        with self._lock:
+            self._counts[field] += 1
+
+    @staticmethod
+    def _check_deadline(deadline: Optional[float]):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceededError("Deadline reached before calling the LLM")
+
+    def _bounded_wait(self, seconds: float, deadline: Optional[float], error: Exception = None) -> float:
+        if deadline is not None and time.monotonic() + seconds >= deadline:
+            raise DeadlineExceededError("Deadline reached waiting for the LLM governor") from error
+        self._record_wait(seconds)
+        return seconds
+
+    def _sleep(self, seconds: float, deadline: Optional[float], error: Exception = None):
+        time.sleep(self._bounded_wait(seconds, deadline, error))
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            recent = sum(t for ts, t in self._usage if ts >= now - 60)
+            return dict(
+                self._counts,
+                concurrency_limit=round(self.limit, 2),
+                max_concurrency=self.max_limit,
+                min_limit_seen=round(self.min_limit_seen, 2),
+                in_flight=self.in_flight,
+                max_in_flight=self.max_in_flight,
+                circuit=self._circuit_state(now),
+                paused_for_seconds=round(max(0.0, self.paused_until - now), 2),
+                tokens_per_minute_limit=self.tokens_per_minute,
+                tokens_last_minute=recent,
+                peak_tokens_per_minute=self.peak_tokens_per_minute,
+                token_budget_available=round(self.token_budget) if self.tokens_per_minute else None,
+                wait_seconds=round(self.wait_seconds, 2),
+            )
+
+
+@lru_cache()
+def get_llm_governor() -> LLMGovernor:
+    """Get the process-wide governor shared by all summarizers."""
+    settings = get_settings()
+    return LLMGovernor(
+        initial_limit=settings.summary_concurrency,
+        max_limit=settings.llm_max_concurrency,
+        tokens_per_minute=settings.llm_tokens_per_minute,
+        max_retries=settings.llm_max_retries,
+        backoff_base=settings.llm_backoff_base_seconds,
+        backoff_max=settings.llm_backoff_max_seconds,
+        breaker_failures=settings.llm_breaker_failures,
+        breaker_cooldown=settings.llm_breaker_cooldown_seconds,
+    )
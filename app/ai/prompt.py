@@ -0,0 +1,147 @@
+import re
+from typing import Iterable, List, Tuple
+
+# Words, numbers and individual punctuation marks
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Subword pieces per word: BPE vocabularies keep most words under ~6 characters whole
+CHARS_PER_WORD_TOKEN = 6
+
+# Label and numbering overhead per comment line
+COMMENT_OVERHEAD_TOKENS = 3
+
+
+SKIPPED_COMMENTS = {'[deleted]', '[removed]'}
+
+
+def _token_cost(piece: str) -> int:
+    return 1 + (len(piece) - 1) // CHARS_PER_WORD_TOKEN
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the model tokens in `text` without calling the API."""
+    return sum(_token_cost(match.group()) for match in TOKEN_PATTERN.finditer(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` after the last whole token that fits in `max_tokens`,
+    keeping one token for the trailing ellipsis.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    used = 0
+    end = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += _token_cost(match.group())
+        if used > max_tokens - 1:
+            break
+        end = match.end()
+    return text[:end].rstrip() + "…"
+
+
+def _word_set(text: str) -> frozenset:
+    return frozenset(word.lower() for word in re.findall(r"\w+", text))
+
+
+def dedupe_comments(comments: Iterable, threshold: float = 0.8) -> List:
+    """
+    Drop deleted comments and comments whose words overlap an earlier
+    kept comment by at least `threshold` (Jaccard similarity).
+    """
+    kept = []
+    seen: List[frozenset] = []
+    for comment in comments:
+        body = (getattr(comment, 'body', '') or '').strip()
+        if not body or body in SKIPPED_COMMENTS:
+            continue
+        words = _word_set(body)
+        if any(words == other or (words | other and len(words & other) / len(words | other) >= threshold)
+               for other in seen):
+            continue
+        kept.append(comment)
+        seen.append(words)
+    return kept
+
+
+def _fair_shares(needs: List[int], budget: int) -> List[int]:
+    """Split `budget` so small needs are met in full and the rest share evenly."""
+    shares = [0] * len(needs)
+    remaining = budget
+    order = sorted(range(len(needs)), key=lambda i: needs[i])
+    for position, index in enumerate(order):
+        share = min(needs[index], remaining // (len(needs) - position))
+        shares[index] = share
+        remaining -= share
+    return shares
+
+
+# "Post Content:" and "Top Comments:" section labels
+SECTION_LABEL_TOKENS = max(estimate_tokens("Post Content:"), estimate_tokens("Top Comments:"))
+
+
+class PostPrompt:
+    """Prompt content for one post and its estimated input tokens."""
+
+    __slots__ = ('text', 'input_tokens', 'comment_count')
+
+    def __init__(self, text: str, input_tokens: int, comment_count: int):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.comment_count = comment_count
+
+
+class PromptBuilder:
+    """
+    Fits a post's title, body and top comments into a fixed input token
+    budget. Comments are chosen by score after near-duplicates are
+    removed; when everything does not fit, the body and comments split
+    the budget and each is truncated at a token boundary.
+    """
+
+    # Comment slices smaller than this carry too little to be worth sending
+    MIN_COMMENT_TOKENS = 12
+
+    def __init__(self, budget: int, max_comments: int = 5, max_title_tokens: int = 64):
+        self.budget = budget
+        self.max_comments = max_comments
+        self.max_title_tokens = max_title_tokens
+
+    def select_comments(self, comments: Iterable) -> List:
+        ranked = sorted(comments, key=lambda c: getattr(c, 'score', 0) or 0, reverse=True)
+        return dedupe_comments(ranked)[:self.max_comments]
+
+    def _split_budget(self, remaining: int, body_need: int, comment_need: int) -> Tuple[int, int]:
+        if body_need + comment_need <= remaining:
+            return body_need, comment_need
+        body_share = min(body_need, max(remaining // 2, remaining - comment_need))
+        return body_share, remaining - body_share
+
+    def build(self, title: str, selftext: str = "", comments: Iterable = ()) -> PostPrompt:
+        title = truncate_to_tokens(title, self.max_title_tokens)
+        content = f"Title: {title}\n\n"
+        remaining = self.budget - estimate_tokens(content)
+
+        selftext = (selftext or "").strip()
+        chosen = self.select_comments(comments)
+        comment_needs = [estimate_tokens(c.body) + COMMENT_OVERHEAD_TOKENS for c in chosen]
+        body_need = estimate_tokens(selftext) + SECTION_LABEL_TOKENS if selftext else 0
+        comments_need = sum(comment_needs) + SECTION_LABEL_TOKENS if chosen else 0
+        body_budget, comment_budget = self._split_budget(max(0, remaining), body_need, comments_need)
+
+        if selftext and body_budget > SECTION_LABEL_TOKENS:
+            content += f"Post Content:\n{truncate_to_tokens(selftext, body_budget - SECTION_LABEL_TOKENS)}\n\n"
+
+        lines = []
+        shares = _fair_shares(comment_needs, max(0, comment_budget - SECTION_LABEL_TOKENS))
+        for comment, need, share in zip(chosen, comment_needs, shares):
+            tokens = share - COMMENT_OVERHEAD_TOKENS
+            if tokens >= min(self.MIN_COMMENT_TOKENS, need - COMMENT_OVERHEAD_TOKENS):
+                lines.append(truncate_to_tokens(comment.body.strip(), tokens))
+        if lines:
+            content += "Top Comments:\n"
+            for i, body in enumerate(lines, 1):
+                content += f"{i}. {body}\n\n"
+
+        return PostPrompt(content, estimate_tokens(content), len(lines))
@@ -1,111 +1,559 @@
-from anthropic import Anthropic
+import asyncio
+import json
+import re
+import time
+from anthropic import Anthropic, APITimeoutError, AsyncAnthropic
+from sqlalchemy.orm import Session
+from app.ai.batches import BATCH_ENDED, CANCEL_POLL_SECONDS, CANCEL_WAIT_SECONDS, MessageBatchClient, result_text
+from app.ai.cache import SummaryStore
+from app.ai.extractive import extractive_summary
+from app.ai.governor import DeadlineExceededError, get_llm_governor
+from app.ai.prompt import PromptBuilder, estimate_tokens
 from app.config import get_settings
 from app.models import RankedPost, DigestPost
-from app.reddit.client import RedditClient
-from typing import List
+from app.reddit.client import RedditClient, RedditPost
+from typing import Dict, List, Optional
 
 settings = get_settings()
 
+# A complete "post_id": "summary" pair, used to salvage truncated batch output
+BATCH_PAIR_PATTERN = re.compile(r'"([A-Za-z0-9_]+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
 
 class PostSummarizer:
     """Uses Claude Haiku to generate post summaries."""
 
-    def __init__(self):
-        self.client = Anthropic(api_key=settings.anthropic_api_key)
+    def __init__(self, db: Optional[Session] = None, batch_client: Optional[MessageBatchClient] = None):
+        # Retries and throttling are handled by the shared governor
+        self.client = Anthropic(
+            api_key=settings.anthropic_api_key, base_url=settings.anthropic_base_url, max_retries=0
+        )
+        self.governor = get_llm_governor()
+        self.batch_client = batch_client
         self.reddit_client = RedditClient()
         self.model = "claude-haiku-4-5-20251001"  # Claude Haiku 4.5
+        self.concurrency = settings.summary_concurrency
+        # Slots for concurrent calls; the governor's adaptive limit decides how many run
+        self.max_concurrency = max(self.concurrency, settings.llm_max_concurrency) if self.concurrency > 1 else 1
+        self.timeout = settings.summary_timeout_seconds
+        # Summaries are only cached when a database session is available
+        self.cache = SummaryStore(db) if db is not None else None
+        self.prompt_builder = PromptBuilder(settings.summary_input_token_budget, settings.summary_max_comments)
+        self.comment_limit = max(settings.summary_comment_candidates, settings.summary_max_comments)
+        # Estimated prompt tokens per post ID, for tuning the input budget
+        self.input_tokens: Dict[str, int] = {}
+        # "extractive" for posts summarized locally instead of by the LLM
+        self.summary_sources: Dict[str, str] = {}
+        self.deadline: Optional[float] = None
 
-    def _get_post_content(self, post: RankedPost) -> str:
-        """Get full post content including top comments."""
-        try:
-            # Create a RedditPost object for fetching comments
-            from app.reddit.client import RedditPost
-            post_data = {
-                'id': post.post_id,
-                'permalink': post.url.replace('https://reddit.com', ''),
-                'title': post.title,
-                'selftext': post.selftext if hasattr(post, 'selftext') else '',
-                'is_self': post.is_self
-            }
-            reddit_post = RedditPost(post_data)
-
-            # Build content string
-            content = f"Title: {post.title}\n\n"
-
-            # Add selftext if it's a text post
-            if post.is_self and post.selftext:
-                content += f"Post Content:\n{post.selftext[:1000]}\n\n"  # Limit to 1000 chars
-
-            # Get top comments
-            comments = self.reddit_client.get_post_comments(reddit_post, limit=5)
-            if comments:
-                content += "Top Comments:\n"
-                for i, comment in enumerate(comments[:5], 1):
-                    if hasattr(comment, 'body'):
-                        comment_text = comment.body[:300]  # Limit each comment
-                        content += f"{i}. {comment_text}\n\n"
-
-            return content
-        except Exception as e:
-            print(f"Error getting post content for {post.post_id}: {e}")
-            return f"Title: {post.title}\n\nPost URL: {post.url}"
+    @staticmethod
+    def _reddit_post(post: RankedPost) -> RedditPost:
+        """Create a RedditPost object for fetching comments."""
+        return RedditPost({
+            'id': post.post_id,
+            'permalink': post.url.replace('https://reddit.com', ''),
+            'title': post.title,
+            'selftext': post.selftext if hasattr(post, 'selftext') else '',
+            'is_self': post.is_self
+        })
+
+    def _format_content(self, post: RankedPost, comments: Optional[List]) -> str:
+        """Build the content string from the post and its top comments within the input token budget."""
+        selftext = post.selftext if post.is_self else ""
+        prompt = self.prompt_builder.build(post.title, selftext, comments or [])
+        self.input_tokens[post.post_id] = prompt.input_tokens + estimate_tokens(self._build_prompt(""))
+        return prompt.text
+
+    def fallback_summary(self, post: RankedPost, comments: Optional[List] = None) -> str:
+        """Local extractive summary for posts the LLM could not summarize in time."""
+        self.summary_sources[post.post_id] = "extractive"
+        selftext = post.selftext if post.is_self else ""
+        bodies = [comment.body for comment in self.prompt_builder.select_comments(comments or [])]
+        return extractive_summary(post.title, selftext, bodies)
+
+    def start_deadline(self, seconds: Optional[float] = None):
+        """
+        Start the per-digest latency budget. LLM calls are cut short at the
+        deadline and unfinished posts get extractive summaries.
+        """
+        seconds = settings.summary_deadline_seconds if seconds is None else seconds
+        self.deadline = time.monotonic() + seconds if seconds else None
+
+    def _call_timeout(self) -> float:
+        """Timeout for the next LLM call: the per-call limit, capped by the time left; 0 once past the deadline."""
+        if self.deadline is None:
+            return self.timeout
+        return max(0.0, min(self.timeout, self.deadline - time.monotonic()))
+
+    def _attempt_timeout(self) -> float:
+        """_call_timeout for an attempt about to start; raises DeadlineExceededError when no time is left."""
+        timeout = self._call_timeout()
+        if timeout <= 0:
+            raise DeadlineExceededError("Summary deadline passed before the call")
+        return timeout
+
+    def _raise_if_cut_short(self, timeout: float, error: Exception):
+        """
+        A timeout the deadline cut short says nothing about the provider:
+        report it as DeadlineExceededError so the governor skips it instead
+        of treating it as congestion. Full SUMMARY_TIMEOUT_SECONDS timeouts
+        are left to propagate.
+        """
+        if timeout < self.timeout:
+            raise DeadlineExceededError("Summary deadline reached during the call") from error
+
+    def _create_message(self, params: dict, tokens: int):
+        """Call the Messages API through the governor, each attempt bounded by the time left."""
+        def attempt():
+            timeout = self._attempt_timeout()
+            try:
+                return self.client.messages.create(**params, timeout=timeout)
+            except APITimeoutError as e:
+                self._raise_if_cut_short(timeout, e)
+                raise
 
-    def summarize_post(self, post: RankedPost) -> str:
-        """Generate AI summary for a single post."""
-        content = self._get_post_content(post)
+        return self.governor.call(attempt, tokens=tokens + params["max_tokens"], deadline=self.deadline)
 
-        prompt = f"""Summarize this Reddit post and its discussion in 2-3 concise sentences.
+    async def _acreate_message(self, client: AsyncAnthropic, params: dict, tokens: int):
+        """Async variant of _create_message."""
+        async def attempt():
+            timeout = self._attempt_timeout()
+            try:
+                return await asyncio.wait_for(client.messages.create(**params), timeout=timeout)
+            except (asyncio.TimeoutError, APITimeoutError) as e:
+                self._raise_if_cut_short(timeout, e)
+                raise
+
+        return await self.governor.acall(attempt, tokens=tokens + params["max_tokens"], deadline=self.deadline)
+
+    @staticmethod
+    def _build_prompt(content: str) -> str:
+        return f"""Summarize this Reddit post and its discussion in 2-3 concise sentences.
 Focus on the key points and main takeaways. Be informative and objective.
 
 {content}
 
 Summary:"""
 
+    def _message_params(self, prompt: str) -> dict:
+        return {
+            "model": self.model,
+            "max_tokens": 150,
+            "temperature": 0.7,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+
+    def to_digest_post(self, post: RankedPost, summary: str) -> DigestPost:
+        return DigestPost(
+            post_id=post.post_id,
+            subreddit=post.subreddit,
+            title=post.title,
+            url=post.url,
+            score=post.score,
+            num_comments=post.num_comments,
+            summary=summary,
+            input_tokens=self.input_tokens.get(post.post_id),
+            summary_source=self.summary_sources.get(post.post_id, "ai")
+        )
+
+    def _cache_key(self, post: RankedPost, content: str) -> Optional[str]:
+        return SummaryStore.make_key(self.model, post.post_id, content) if self.cache else None
+
+    def _cached_summary(self, key: Optional[str]) -> Optional[str]:
+        return self.cache.get(key) if key else None
+
+    def _store_summary(self, key: Optional[str], post: RankedPost, summary: str):
+        if key:
+            self.cache.put(key, post.post_id, self.model, summary)
+
+    def summarize_post(self, post: RankedPost, comments: Optional[List] = None) -> str:
+        """
+        Generate AI summary for a single post, reusing a cached summary of the same content.
+        Each call is capped at SUMMARY_TIMEOUT_SECONDS and the time left before the deadline.
+        Falls back to an extractive summary on errors or once the deadline has passed.
+        """
+        if comments is None:
+            comments = self.fetch_comments(post)
+        content = self._format_content(post, comments)
+        key = self._cache_key(post, content)
+        cached = self._cached_summary(key)
+        if cached is not None:
+            return cached
+
+        timeout = self._call_timeout()
+        if timeout <= 0:
+            print(f"Summary deadline passed before post {post.post_id}; using extractive summary")
+            return self.fallback_summary(post, comments)
+
+        prompt = self._build_prompt(content)
+
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=150,
-                temperature=0.7,
-                messages=[{
-                    "role": "user",
-                    "content": prompt
-                }]
-            )
+            message = self._create_message(self._message_params(prompt), self.input_tokens.get(post.post_id, 0))
 
             summary = message.content[0].text.strip()
+            self._store_summary(key, post, summary)
             return summary
+        except APITimeoutError:
+            print(f"Timed out summarizing post {post.post_id}")
+            return self.fallback_summary(post, comments)
         except Exception as e:
             print(f"Error summarizing post {post.post_id}: {e}")
-            return f"Unable to generate summary. {post.title}"
+            return self.fallback_summary(post, comments)
+
+    async def asummarize_post(self, client: AsyncAnthropic, post: RankedPost,
+                              comments: Optional[List] = None) -> str:
+        """Generate AI summary for a single post with the async client, within the per-post timeout and deadline."""
+        if comments is None:
+            comments = await self.afetch_comments(post)
+        content = self._format_content(post, comments)
+        key = self._cache_key(post, content)
+        cached = self._cached_summary(key)
+        if cached is not None:
+            return cached
 
-    def summarize_posts(self, posts: List[RankedPost]) -> List[DigestPost]:
-        """Generate summaries for multiple posts."""
+        timeout = self._call_timeout()
+        if timeout <= 0:
+            print(f"Summary deadline passed before post {post.post_id}; using extractive summary")
+            return self.fallback_summary(post, comments)
+
+        try:
+            params = self._message_params(self._build_prompt(content))
+            message = await self._acreate_message(client, params, self.input_tokens.get(post.post_id, 0))
+            summary = message.content[0].text.strip()
+            self._store_summary(key, post, summary)
+            return summary
+        except asyncio.TimeoutError:
+            print(f"Timed out summarizing post {post.post_id}")
+            return self.fallback_summary(post, comments)
+        except Exception as e:
+            print(f"Error summarizing post {post.post_id}: {e}")
+            return self.fallback_summary(post, comments)
+
+    async def asummarize_posts(self, posts: List[RankedPost],
+                               comments: Optional[Dict[str, List]] = None,
+                               concurrency: Optional[int] = None) -> List[DigestPost]:
+        """
+        Summarize posts concurrently, at most `concurrency` at a time
+        (default: the governor's ceiling, which then sets the pace).
+        Results keep the original ranking order.
+        """
+        comments = comments or {}
+        semaphore = asyncio.Semaphore(max(1, concurrency or self.max_concurrency))
+        # Retries and throttling are handled by the shared governor
+        client = AsyncAnthropic(
+            api_key=settings.anthropic_api_key, base_url=settings.anthropic_base_url, max_retries=0
+        )
+
+        async def summarize(post: RankedPost) -> DigestPost:
+            async with semaphore:
+                summary = await self.asummarize_post(client, post, comments.get(post.post_id))
+            return self.to_digest_post(post, summary)
+
+        try:
+            return list(await asyncio.gather(*(summarize(post) for post in posts)))
+        finally:
+            await client.close()
+
+    def finish_run(self, digest_posts: List[DigestPost]):
+        """Evict stale cached summaries, log prompt sizes and fallbacks, and clear the deadline."""
+        if self.cache:
+            self.cache.evict()
+        self._report_input_tokens(digest_posts)
+        fallbacks = sum(1 for post in digest_posts if post.summary_source == "extractive")
+        if fallbacks:
+            print(f"{fallbacks} of {len(digest_posts)} posts got extractive summaries")
+        self.deadline = None
+
+    def _report_input_tokens(self, digest_posts: List[DigestPost]):
+        counts = [post.input_tokens for post in digest_posts if post.input_tokens is not None]
+        if counts:
+            print(
+                f"Prompt input tokens: {sum(counts)} across {len(counts)} posts "
+                f"(max {max(counts)}; content budget {self.prompt_builder.budget} per post)"
+            )
+
+    def _summarize_individually(self, posts: List[RankedPost],
+                                comments: Optional[Dict[str, List]] = None) -> List[DigestPost]:
+        """One request per post, concurrently when SUMMARY_CONCURRENCY is above 1."""
+        if self.concurrency > 1 and len(posts) > 1:
+            return asyncio.run(self.asummarize_posts(posts, comments))
+
+        comments = comments or {}
         digest_posts = []
 
         for post in posts:
-            summary = self.summarize_post(post)
-
-            digest_post = DigestPost(
-                post_id=post.post_id,
-                subreddit=post.subreddit,
-                title=post.title,
-                url=post.url,
-                score=post.score,
-                num_comments=post.num_comments,
-                summary=summary
-            )
-            digest_posts.append(digest_post)
+            summary = self.summarize_post(post, comments.get(post.post_id))
+            digest_posts.append(self.to_digest_post(post, summary))
 
         return digest_posts
 
-    def summarize_posts_batch(self, posts: List[RankedPost]) -> List[DigestPost]:
+    def summarize_posts(self, posts: List[RankedPost],
+                        comments: Optional[Dict[str, List]] = None) -> List[DigestPost]:
+        """
+        Generate summaries for multiple posts.
+        `comments` maps post IDs to prefetched comments; other posts fetch their own.
+        Packs several posts per request when SUMMARY_MODE is "batch".
+        """
+        if self.deadline is None:
+            self.start_deadline()
+        if settings.summary_mode == "batch":
+            return self.summarize_posts_batch(posts, comments)
+
+        digest_posts = self._summarize_individually(posts, comments)
+        self.finish_run(digest_posts)
+        return digest_posts
+
+    def fetch_comments(self, post: RankedPost) -> List:
+        """Fetch comment candidates for a post; empty on errors."""
+        try:
+            return self.reddit_client.get_post_comments(self._reddit_post(post), limit=self.comment_limit)
+        except Exception as e:
+            print(f"Error fetching comments for {post.post_id}: {e}")
+            return []
+
+    async def afetch_comments(self, post: RankedPost) -> List:
+        """Async variant of fetch_comments; the request runs off the event loop."""
+        try:
+            return await self.reddit_client.aget_post_comments(self._reddit_post(post), limit=self.comment_limit)
+        except Exception as e:
+            print(f"Error fetching comments for {post.post_id}: {e}")
+            return []
+
+    def _pack_batches(self, pending: List[tuple]) -> List[List[tuple]]:
+        """
+        Greedily group (post, content, key) entries, in order, so each group
+        stays under the prompt token budget and post limit. A post larger
+        than the budget gets a group of its own.
+        """
+        budget = settings.summary_batch_token_budget
+        max_posts = max(1, settings.summary_batch_max_posts)
+        batches = []
+        current = []
+        used = estimate_tokens(self._build_batch_prompt([]))
+
+        for entry in pending:
+            tokens = estimate_tokens(self._format_batch_entry(entry[0], entry[1]))
+            if current and (used + tokens > budget or len(current) >= max_posts):
+                batches.append(current)
+                current = []
+                used = estimate_tokens(self._build_batch_prompt([]))
+            current.append(entry)
+            used += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _format_batch_entry(post: RankedPost, content: str) -> str:
+        return f"=== Post ID: {post.post_id} ===\n{content}\n"
+
+    def _build_batch_prompt(self, entries: List[tuple]) -> str:
+        posts_text = "\n".join(self._format_batch_entry(post, content) for post, content, _ in entries)
+        return f"""Summarize each Reddit post below and its discussion in 2-3 concise sentences.
+Focus on the key points and main takeaways. Be informative and objective.
+
+Respond with only a JSON object that maps each post ID to its summary, for example:
+{{"abc123": "Summary of the first post.", "def456": "Summary of the second post."}}
+
+{posts_text}"""
+
+    @staticmethod
+    def _parse_batch_response(text: str, post_ids: List[str]) -> Dict[str, str]:
+        """
+        Extract {post_id: summary} from a batch response. Tolerates code fences,
+        surrounding prose, a list of {"post_id", "summary"} objects and
+        truncated output; unknown IDs and empty summaries are dropped.
+        """
+        wanted = set(post_ids)
+        parsed = None
+
+        start, end = text.find('{'), text.rfind('}')
+        list_start, list_end = text.find('['), text.rfind(']')
+        candidates = []
+        if list_start != -1 and list_end > list_start and (start == -1 or list_start < start):
+            candidates.append(text[list_start:list_end + 1])
+        if start != -1 and end > start:
+            candidates.append(text[start:end + 1])
+
+        for candidate in candidates:
+            try:
+                parsed = json.loads(candidate)
+                break
+            except ValueError:
+                continue
+
+        pairs = []
+        if isinstance(parsed, dict):
+            pairs = parsed.items()
+        elif isinstance(parsed, list):
+            pairs = [
+                (item.get('post_id') or item.get('id'), item.get('summary'))
+                for item in parsed if isinstance(item, dict)
+            ]
+        else:
+            # Salvage complete "id": "summary" pairs from malformed or truncated JSON
+            for match in BATCH_PAIR_PATTERN.finditer(text):
+                try:
+                    pairs.append((match.group(1), json.loads(f'"{match.group(2)}"')))
+                except ValueError:
+                    continue
+
+        summaries = {}
+        for post_id, summary in pairs:
+            if post_id in wanted and isinstance(summary, str) and summary.strip():
+                summaries[post_id] = summary.strip()
+        return summaries
+
+    def _summarize_batch(self, entries: List[tuple]) -> Dict[str, str]:
+        """Summarize a group of posts in one request; returns the summaries it could parse."""
+        prompt = self._build_batch_prompt(entries)
+        params = self._message_params(prompt)
+        params["max_tokens"] = 200 * len(entries)
+
+        timeout = self._call_timeout()
+        if timeout <= 0:
+            return {}
+
+        try:
+            message = self._create_message(params, estimate_tokens(prompt))
+            text = "".join(block.text for block in message.content if hasattr(block, 'text'))
+        except Exception as e:
+            print(f"Error summarizing batch of {len(entries)} posts: {e}")
+            return {}
+
+        return self._parse_batch_response(text, [post.post_id for post, _, _ in entries])
+
+    def summarize_posts_batch(self, posts: List[RankedPost],
+                              comments: Optional[Dict[str, List]] = None) -> List[DigestPost]:
         """
         Batch summarization for better efficiency.
-        Process multiple posts in a single API call.
+        Packs posts into as few requests as the token budget allows and asks
+        for JSON keyed by post ID. Posts missing from the parsed output are
+        summarized individually.
         """
         if not posts:
             return []
 
-        # For now, use individual calls for better error handling
-        # Can optimize later with batching if needed
-        return self.summarize_posts(posts)
+        if self.deadline is None:
+            self.start_deadline()
+        comments = dict(comments or {})
+        summaries, pending = self._prepare_pending(posts, comments)
+
+        for entries in self._pack_batches(pending):
+            batch_summaries = self._summarize_batch(entries)
+            for post, _, key in entries:
+                summary = batch_summaries.get(post.post_id)
+                if summary is not None:
+                    summaries[post.post_id] = summary
+                    self._store_summary(key, post, summary)
+
+        return self._finish(posts, comments, summaries, "Batch output")
+
+    def _prepare_pending(self, posts: List[RankedPost], comments: Dict[str, List]):
+        """
+        Build each post's content, fetching comments not already in `comments`.
+        Returns cached summaries by post ID and (post, content, key) entries
+        still to summarize.
+        """
+        summaries = {}
+        pending = []
+
+        for post in posts:
+            if post.post_id not in comments:
+                comments[post.post_id] = self.fetch_comments(post)
+            content = self._format_content(post, comments[post.post_id])
+            key = self._cache_key(post, content)
+            cached = self._cached_summary(key)
+            if cached is not None:
+                summaries[post.post_id] = cached
+            else:
+                pending.append((post, content, key))
+
+        return summaries, pending
+
+    def _finish(self, posts: List[RankedPost], comments: Dict[str, List],
+                summaries: Dict[str, str], source: str) -> List[DigestPost]:
+        """Summarize posts missing from `summaries` individually and build the digest in order."""
+        missing = [post for post in posts if post.post_id not in summaries]
+        if missing:
+            print(f"{source} missed {len(missing)} posts; summarizing them individually")
+            for digest_post in self._summarize_individually(missing, comments):
+                summaries[digest_post.post_id] = digest_post.summary
+
+        digest_posts = [self.to_digest_post(post, summaries[post.post_id]) for post in posts]
+        self.finish_run(digest_posts)
+        return digest_posts
+
+    def _collect_message_batch(self, entries: List[tuple], deadline: float) -> Dict[str, str]:
+        """
+        Submit one single-post request per entry as a Message Batch and poll
+        until it ends or the deadline passes. A late batch is canceled and,
+        once the cancel completes, whatever results finished are kept.
+        """
+        client = self.batch_client or MessageBatchClient()
+        batch_requests = [
+            {"custom_id": post.post_id, "params": self._message_params(self._build_prompt(content))}
+            for post, content, _ in entries
+        ]
+
+        try:
+            batch = client.create(batch_requests)
+            while batch.get('processing_status') != BATCH_ENDED and time.monotonic() < deadline:
+                time.sleep(max(0.0, min(settings.message_batches_poll_seconds, deadline - time.monotonic())))
+                batch = client.retrieve(batch['id'])
+
+            if batch.get('processing_status') != BATCH_ENDED:
+                print(f"Message batch {batch['id']} missed its deadline; canceling")
+                batch = client.cancel(batch['id'])
+                # Results become readable once the cancel finishes and the batch ends
+                cancel_deadline = time.monotonic() + CANCEL_WAIT_SECONDS
+                while batch.get('processing_status') != BATCH_ENDED and time.monotonic() < cancel_deadline:
+                    time.sleep(CANCEL_POLL_SECONDS)
+                    batch = client.retrieve(batch['id'])
+                if batch.get('processing_status') != BATCH_ENDED:
+                    print(f"Message batch {batch['id']} still {batch.get('processing_status')} after cancel")
+                    return {}
+
+            summaries = {}
+            for result in client.results(batch):
+                text = result_text(result)
+                if text:
+                    summaries[result.get('custom_id')] = text
+            return summaries
+        except Exception as e:
+            print(f"Error running message batch: {e}")
+            return {}
+
+    def summarize_posts_offline(self, posts: List[RankedPost],
+                                comments: Optional[Dict[str, List]] = None,
+                                deadline_seconds: Optional[float] = None) -> List[DigestPost]:
+        """
+        Summarize through the Message Batches API for scheduled runs, where
+        cost matters more than latency. Posts without a result by the
+        deadline are summarized with direct calls under SUMMARY_DEADLINE_SECONDS.
+        """
+        if not posts:
+            return []
+
+        if deadline_seconds is None:
+            deadline_seconds = settings.message_batches_deadline_minutes * 60
+        deadline = time.monotonic() + deadline_seconds
+
+        comments = dict(comments or {})
+        summaries, pending = self._prepare_pending(posts, comments)
+
+        if pending:
+            batch_summaries = self._collect_message_batch(pending, deadline)
+            for post, _, key in pending:
+                summary = batch_summaries.get(post.post_id)
+                if summary is not None:
+                    summaries[post.post_id] = summary
+                    self._store_summary(key, post, summary)
+
+        # Stragglers get the normal summary budget, starting now
+        self.start_deadline()
+        return self._finish(posts, comments, summaries, "Message batch")
@@ -3,12 +3,16 @@ from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
 from app.models import (
-    Subreddit, SubredditCreate, SubredditResponse,
-    UserPreferences, PreferencesUpdate, PreferencesResponse
+    Subreddit, SubredditCreate, SubredditUpdate, SubredditResponse,
+    UserPreferences, PreferencesUpdate, PreferencesResponse, RankingPreviewRequest
 )
 from app.reddit.fetcher import RedditFetcher
+from app.reddit.client import get_request_stats
+from app.ai.cache import get_summary_cache_stats
+from app.ai.governor import get_llm_governor
 from app.ai.summarizer import PostSummarizer
 from app.email.sender import EmailSender
+from app.pipeline import build_digest
 from app.config import get_settings
 
 router = APIRouter()
@@ -34,6 +38,9 @@ def add_subreddit(subreddit: SubredditCreate, db: Session = Depends(get_db)):
         name=subreddit.name,
         min_upvotes=subreddit.min_upvotes,
         min_comments=subreddit.min_comments,
+        weight=subreddit.weight,
+        min_posts=subreddit.min_posts,
+        max_posts=subreddit.max_posts,
         enabled=True
     )
     db.add(new_subreddit)
@@ -42,6 +49,26 @@ def add_subreddit(subreddit: SubredditCreate, db: Session = Depends(get_db)):
     return new_subreddit
 
 
+@router.patch("/subreddits/{subreddit_id}", response_model=SubredditResponse)
+def update_subreddit(subreddit_id: int, updates: SubredditUpdate, db: Session = Depends(get_db)):
+    """Update a subreddit's thresholds, weight and quotas."""
+    subreddit = db.query(Subreddit).filter(Subreddit.id == subreddit_id).first()
+    if not subreddit:
+        raise HTTPException(status_code=404, detail="Subreddit not found")
+
+    for field, value in updates.dict(exclude_unset=True).items():
+        setattr(subreddit, field, value)
+
+    # Check quotas against stored values for fields not in this update
+    if subreddit.max_posts is not None and subreddit.min_posts > subreddit.max_posts:
+        db.rollback()
+        raise HTTPException(status_code=422, detail="min_posts cannot exceed max_posts")
+
+    db.commit()
+    db.refresh(subreddit)
+    return subreddit
+
+
 @router.delete("/subreddits/{subreddit_id}")
 def delete_subreddit(subreddit_id: int, db: Session = Depends(get_db)):
     """Remove a subreddit."""
@@ -97,6 +124,29 @@ def update_preferences(updates: PreferencesUpdate, db: Session = Depends(get_db)
     return prefs
 
 
+@router.get("/stats")
+def get_stats():
+    """Get request counters for external APIs, the summary cache and the LLM governor."""
+    return {
+        "reddit": get_request_stats().snapshot(),
+        "summaries": get_summary_cache_stats().snapshot(),
+        "llm": get_llm_governor().snapshot()
+    }
+
+
+@router.post("/ranking/preview")
+def preview_ranking(request: RankingPreviewRequest, db: Session = Depends(get_db)):
+    """Rank stored candidates with alternative weights, without fetching or summarizing."""
+    fetcher = RedditFetcher(db)
+    prefs = db.query(UserPreferences).first()
+    count = request.count or prefs.posts_per_digest
+    posts = fetcher.rank_stored_posts(count, request.weights)
+    return {
+        "posts": [post.dict() for post in posts],
+        "count": len(posts)
+    }
+
+
 @router.post("/preview")
 def generate_preview(db: Session = Depends(get_db)):
     """Generate a preview of the digest without sending."""
@@ -104,18 +154,18 @@ def generate_preview(db: Session = Depends(get_db)):
         # Fetch posts
         fetcher = RedditFetcher(db)
         prefs = db.query(UserPreferences).first()
-        posts = fetcher.get_top_posts(count=prefs.posts_per_digest)
 
-        if not posts:
-            raise HTTPException(status_code=404, detail="No posts found")
+        # Fetch, load comments (reusing stored ones) and summarize as a pipeline
+        digest = build_digest(fetcher, PostSummarizer(db), prefs.posts_per_digest, render=False)
+        digest_posts = digest.posts
 
-        # Generate summaries
-        summarizer = PostSummarizer()
-        digest_posts = summarizer.summarize_posts(posts)
+        if not digest_posts:
+            raise HTTPException(status_code=404, detail="No posts found")
 
         return {
             "posts": [post.dict() for post in digest_posts],
-            "count": len(digest_posts)
+            "count": len(digest_posts),
+            "pipeline": digest.stats
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -144,18 +194,18 @@ def send_preview_digest(db: Session = Depends(get_db)):
         # Fetch posts
         fetcher = RedditFetcher(db)
         prefs = db.query(UserPreferences).first()
-        posts = fetcher.get_top_posts(count=prefs.posts_per_digest)
 
-        if not posts:
-            raise HTTPException(status_code=404, detail="No posts found")
+        # Fetch, load comments, summarize and render as a pipeline
+        digest = build_digest(fetcher, PostSummarizer(db), prefs.posts_per_digest)
+        digest_posts = digest.posts
 
-        # Generate summaries
-        summarizer = PostSummarizer()
-        digest_posts = summarizer.summarize_posts(posts)
+        if not digest_posts:
+            raise HTTPException(status_code=404, detail="No posts found")
 
         # Send email (preview mode - don't mark posts as sent)
         sender = EmailSender()
-        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=True)
+        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=True,
+                                     post_blocks=digest.post_blocks)
 
         if success:
             return {
@@ -176,18 +226,18 @@ def send_daily_digest(db: Session = Depends(get_db)):
         # Fetch posts
         fetcher = RedditFetcher(db)
         prefs = db.query(UserPreferences).first()
-        posts = fetcher.get_top_posts(count=prefs.posts_per_digest)
 
-        if not posts:
-            return {"status": "no_posts", "message": "No new posts to send"}
+        # Fetch, load comments, summarize and render as a pipeline
+        digest = build_digest(fetcher, PostSummarizer(db), prefs.posts_per_digest)
+        digest_posts = digest.posts
 
-        # Generate summaries
-        summarizer = PostSummarizer()
-        digest_posts = summarizer.summarize_posts(posts)
+        if not digest_posts:
+            return {"status": "no_posts", "message": "No new posts to send"}
 
         # Send email
         sender = EmailSender()
-        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=False)
+        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=False,
+                                     post_blocks=digest.post_blocks)
 
         if success:
             # Mark posts as sent
@@ -1,16 +1,62 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
+import time
 from app.database import SessionLocal
 from app.reddit.fetcher import RedditFetcher
 from app.ai.summarizer import PostSummarizer
 from app.email.sender import EmailSender
+from app.pipeline import build_digest
 from app.models import UserPreferences
+from app.config import get_settings
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def crawl_job():
+    """
+    Job function to pre-fetch listings and comments into the database.
+    Runs through the day so the digest can be built from local data.
+    """
+    db = SessionLocal()
+    try:
+        stats = RedditFetcher(db).crawl()
+        logger.info(
+            f"Crawl finished: {stats['candidates']} candidates, "
+            f"{stats['comments_fetched']} comment threads fetched"
+        )
+    except Exception as e:
+        logger.error(f"Error in background crawl: {e}")
+    finally:
+        db.close()
+
+
+def _crawl_is_fresh(fetcher: RedditFetcher) -> bool:
+    """Whether every active subreddit was crawled recently enough to skip fetching."""
+    settings = get_settings()
+    if not settings.crawler_enabled:
+        return False
+    last_crawl = fetcher.last_crawled_at()
+    max_age = timedelta(minutes=2 * settings.crawler_interval_minutes)
+    return last_crawl is not None and datetime.utcnow() - last_crawl <= max_age
+
+
+def _seconds_until_digest_time(now: datetime = None) -> float:
+    """
+    Seconds left until today's DIGEST_TIME when the job started early for a
+    message batch. Zero once it has passed, e.g. for a late or manual run.
+    """
+    settings = get_settings()
+    now = now or datetime.now()
+    hour, minute = settings.digest_time.split(":")
+    target = now.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0)
+    wait = (target - now).total_seconds() % 86400
+    return wait if wait <= settings.message_batches_deadline_minutes * 60 else 0.0
+
+
 def send_scheduled_digest():
     """
     Job function to send daily digest.
@@ -26,23 +72,36 @@ def send_scheduled_digest():
             logger.error("No preferences found")
             return
 
-        # Fetch posts
+        # Rank from crawled data when it is fresh, otherwise fetch now
         fetcher = RedditFetcher(db)
-        posts = fetcher.get_top_posts(count=prefs.posts_per_digest)
+        from_store = _crawl_is_fresh(fetcher)
 
-        if not posts:
+        # Fetch, summarize and render; message batches run as phases
+        digest = build_digest(
+            fetcher, PostSummarizer(db), prefs.posts_per_digest,
+            refresh=not from_store, offline=get_settings().message_batches_enabled
+        )
+        digest_posts = digest.posts
+
+        if not digest_posts:
             logger.info("No new posts found for digest")
             return
 
-        logger.info(f"Found {len(posts)} posts for digest")
+        logger.info(f"Built digest of {len(digest_posts)} posts ({'stored' if from_store else 'fetched'})")
+        for stage, stats in digest.stats.items():
+            logger.info(f"Pipeline stage {stage}: {stats}")
 
-        # Generate summaries
-        summarizer = PostSummarizer()
-        digest_posts = summarizer.summarize_posts(posts)
+        # A message batch started early; hold the email until the digest time
+        if get_settings().message_batches_enabled:
+            wait = _seconds_until_digest_time()
+            if wait > 0:
+                logger.info(f"Digest ready; waiting {wait:.0f}s until {get_settings().digest_time} to send")
+                time.sleep(wait)
 
         # Send email
         sender = EmailSender()
-        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=False)
+        success = sender.send_digest(prefs.email_address, digest_posts, is_preview=False,
+                                     post_blocks=digest.post_blocks)
 
         if success:
             # Mark posts as sent
@@ -67,20 +126,38 @@ def start_scheduler():
     scheduler = BackgroundScheduler()
 
     # Get digest time from settings (default 06:00)
-    from app.config import get_settings
     settings = get_settings()
     hour, minute = settings.digest_time.split(":")
+    start = datetime(2000, 1, 1, int(hour), int(minute))
+    if settings.message_batches_enabled:
+        # Submit the message batch early; the email still waits for the digest time
+        start -= timedelta(minutes=settings.message_batches_deadline_minutes)
 
     # Schedule daily digest
     scheduler.add_job(
         send_scheduled_digest,
-        trigger=CronTrigger(hour=int(hour), minute=int(minute)),
+        trigger=CronTrigger(hour=start.hour, minute=start.minute),
         id="daily_digest",
         name="Send daily Reddit digest",
         replace_existing=True
     )
 
+    # Pre-fetch listings and comments through the day, starting now
+    if settings.crawler_enabled:
+        scheduler.add_job(
+            crawl_job,
+            trigger=IntervalTrigger(minutes=settings.crawler_interval_minutes),
+            id="background_crawl",
+            name="Pre-fetch Reddit posts and comments",
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+
     scheduler.start()
     logger.info(f"Scheduler started. Digest will be sent daily at {settings.digest_time}")
+    if settings.message_batches_enabled:
+        logger.info(f"Message batches are submitted daily at {start:%H:%M}")
 
     return scheduler
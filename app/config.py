@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -20,6 +21,71 @@ class Settings(BaseSettings):
     # Digest Configuration
     digest_time: str = "06:00"
     posts_per_digest: int = 12
+    min_rank_score: Optional[float] = None  # Posts ranked below this are never selected
+
+    # Summarization
+    anthropic_base_url: str = "https://api.anthropic.com"  # Point at app.ai.fake_batches for offline runs
+    summary_concurrency: int = 4  # Posts summarized in parallel; 1 keeps the serial path
+    summary_timeout_seconds: float = 30.0
+    summary_deadline_seconds: float = 120.0  # Per-digest budget; later posts get extractive summaries. 0 disables
+    summary_input_token_budget: int = 700  # Estimated tokens of title, body and comments per post
+    summary_max_comments: int = 5
+    summary_comment_candidates: int = 10  # Comments fetched per post to pick the highest-scored from
+    comment_cache_ttl_hours: int = 6  # Stored comment threads are reused until they are this old
+    summary_mode: str = "single"  # "single" (one request per post) or "batch" (several posts per request)
+    summary_batch_max_posts: int = 6
+    summary_batch_token_budget: int = 4000  # Estimated prompt tokens per batch request
+    message_batches_enabled: bool = False  # Scheduled digest summarizes through the Message Batches API
+    message_batches_deadline_minutes: int = 30  # Batch is submitted this much before DIGEST_TIME; stragglers go synchronous
+    message_batches_poll_seconds: float = 30.0
+    llm_max_concurrency: int = 8  # Ceiling for the adaptive in-flight limit, which starts at SUMMARY_CONCURRENCY
+    llm_tokens_per_minute: int = 50000  # Input + output token budget; 0 disables
+    llm_max_retries: int = 3  # Retries for 429/529/5xx, timeouts and connection errors
+    llm_backoff_base_seconds: float = 1.0
+    llm_backoff_max_seconds: float = 30.0
+    llm_breaker_failures: int = 5  # Consecutive failures that open the circuit breaker
+    llm_breaker_cooldown_seconds: float = 60.0
+    summary_cache_ttl_hours: int = 168
+    summary_cache_max_entries: int = 5000  # Least recently used summaries are evicted past this
+
+    # Email
+    email_minify_html: bool = True  # Keeps larger digests under Gmail's ~102KB clipping limit
+
+    # Digest Pipeline
+    pipeline_queue_size: int = 4  # Bound on each queue between stages
+    pipeline_comment_workers: int = 4
+    pipeline_render_workers: int = 1  # Summaries use LLM_MAX_CONCURRENCY workers, gated by the governor
+
+    # Reddit Fetching
+    reddit_base_url: str = "https://www.reddit.com"  # Point at app.reddit.replay for offline runs
+    reddit_record_dir: str = ""  # Record responses here for replay; empty disables
+    reddit_requests_per_second: float = 1.0
+    reddit_burst: int = 1
+    reddit_max_requests_per_second: float = 5.0  # Ceiling when X-Ratelimit headers allow more
+    reddit_max_retries: int = 3
+    reddit_backoff_base_seconds: float = 1.0
+    reddit_backoff_max_seconds: float = 60.0
+    reddit_fetch_concurrency: int = 4
+    reddit_cache_dir: str = ".reddit_cache"  # Empty string disables the cache
+    reddit_cache_ttl_seconds: int = 900
+    reddit_listing_limit: int = 100  # Posts per subreddit; deeper listings are paged
+    max_post_age_hours: Optional[float] = None
+    incremental_fetch: bool = True
+    fetch_refresh_window_hours: float = 24.0  # Stored posts this young are rescored and ranked
+    fetch_refresh_limit: int = 300  # Stored posts rescored per subreddit per run, least recently refreshed first
+    fetch_full_refresh_hours: float = 24.0  # Refetch the full hot listing after this long
+
+    # Score Snapshots
+    snapshot_interval_minutes: int = 15  # At most one snapshot per post per interval
+    snapshot_full_resolution_hours: float = 6.0  # Older snapshots are thinned to one per hour
+    snapshot_retention_hours: float = 72.0
+    velocity_window_hours: float = 3.0
+    velocity_min_span_minutes: float = 15.0
+
+    # Background Crawler
+    crawler_enabled: bool = True
+    crawler_interval_minutes: int = 60
+    crawler_comment_posts: int = 30  # Top candidates whose comments are prefetched each crawl
 
     class Config:
         env_file = ".env"
@@ -2,7 +2,8 @@ import resend
 from app.config import get_settings
 from app.models import DigestPost
 from app.email.templates import generate_digest_html
-from typing import List
+from typing import List, Optional
+from markupsafe import Markup
 from datetime import datetime
 
 settings = get_settings()
@@ -16,11 +17,12 @@ class EmailSender:
         self.from_email = "digest@yourdomain.com"  # Update with your verified domain
         self.from_name = "Reddit Digest"
 
-    def send_digest(self, recipient: str, posts: List[DigestPost], is_preview: bool = False) -> bool:
-        """Send daily digest email."""
+    def send_digest(self, recipient: str, posts: List[DigestPost], is_preview: bool = False,
+                    post_blocks: Optional[List[Markup]] = None) -> bool:
+        """Send daily digest email, reusing per-post HTML blocks when already rendered."""
         try:
             # Generate email HTML
-            html_content = generate_digest_html(posts, is_preview)
+            html_content = generate_digest_html(posts, is_preview, post_blocks)
 
             # Prepare subject line
             date_str = datetime.now().strftime("%B %d, %Y")
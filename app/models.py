@@ -1,11 +1,20 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List, Dict, Iterator, Sequence
 
 Base = declarative_base()
 
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def chunked(items: Sequence, size: int = LOOKUP_CHUNK_SIZE) -> Iterator[Sequence]:
+    """Split items into slices small enough for one IN (...) lookup."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class Subreddit(Base):
     """Subreddit configuration stored in database."""
@@ -16,6 +25,9 @@ class Subreddit(Base):
     enabled = Column(Boolean, default=True)
     min_upvotes = Column(Integer, default=50)
     min_comments = Column(Integer, default=5)
+    weight = Column(Float, default=1.0)  # Relative share of digest slots
+    min_posts = Column(Integer, default=0)
+    max_posts = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -42,17 +54,102 @@ class PostCache(Base):
     score = Column(Integer)
     num_comments = Column(Integer)
     url = Column(String)
-    created_utc = Column(Float)
+    permalink = Column(String, nullable=True)
+    upvote_ratio = Column(Float, nullable=True)
+    is_self = Column(Boolean, nullable=True)
+    selftext = Column(Text, nullable=True)
+    # Ranking features computed at ingest; title/content ones are reused
+    # until the hash of title, selftext and post type changes
+    title_quality = Column(Float, nullable=True)
+    content_score = Column(Float, nullable=True)
+    engagement = Column(Float, nullable=True)
+    features_hash = Column(String, nullable=True)
+    created_utc = Column(Float, index=True)
     fetched_at = Column(DateTime, default=datetime.utcnow)
     sent = Column(Boolean, default=False)
     sent_at = Column(DateTime, nullable=True)
 
 
+class CommentCache(Base):
+    """Top comments fetched ahead of the digest, stored as zlib-compressed JSON."""
+    __tablename__ = "comment_cache"
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(String, unique=True, index=True)
+    comments = Column(Text)  # Uncompressed JSON written by older versions
+    payload = Column(LargeBinary)
+    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class SummaryCache(Base):
+    """AI summaries keyed by a hash of the model and the exact prompt content."""
+    __tablename__ = "summary_cache"
+
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String(64), unique=True, index=True)
+    post_id = Column(String, index=True)
+    model = Column(String)
+    summary = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ScoreSnapshot(Base):
+    """Append-only score samples per post, used for windowed velocity."""
+    __tablename__ = "score_snapshots"
+    __table_args__ = (
+        Index("ix_score_snapshots_post_ts", "post_id", "ts"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    post_id = Column(String, nullable=False)
+    ts = Column(Integer, nullable=False, index=True)  # Unix seconds
+    score = Column(Integer)
+    num_comments = Column(Integer)
+
+
+class FetchState(Base):
+    """Per-subreddit high-water mark for incremental fetching."""
+    __tablename__ = "fetch_state"
+
+    id = Column(Integer, primary_key=True)
+    subreddit = Column(String, unique=True, index=True)
+    newest_created_utc = Column(Float, nullable=True)
+    newest_fullname = Column(String, nullable=True)
+    last_fetched_at = Column(DateTime, nullable=True)
+    last_full_fetch_at = Column(DateTime, nullable=True)  # Last full hot relisting
+
+
 # Pydantic models for API
 class SubredditCreate(BaseModel):
     name: str
-    min_upvotes: int = 50
-    min_comments: int = 5
+    min_upvotes: int = Field(50, ge=0)
+    min_comments: int = Field(5, ge=0)
+    weight: float = Field(1.0, ge=0)
+    min_posts: int = Field(0, ge=0)
+    max_posts: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode='after')
+    def check_quotas(self):
+        if self.max_posts is not None and self.min_posts > self.max_posts:
+            raise ValueError("min_posts cannot exceed max_posts")
+        return self
+
+
+class SubredditUpdate(BaseModel):
+    """Partial update; only max_posts may be cleared with null."""
+    min_upvotes: Optional[int] = Field(None, ge=0)
+    min_comments: Optional[int] = Field(None, ge=0)
+    weight: Optional[float] = Field(None, ge=0)
+    min_posts: Optional[int] = Field(None, ge=0)
+    max_posts: Optional[int] = Field(None, ge=0)
+
+    @field_validator('min_upvotes', 'min_comments', 'weight', 'min_posts')
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("cannot be null")
+        return value
 
 
 class SubredditResponse(BaseModel):
@@ -61,6 +158,9 @@ class SubredditResponse(BaseModel):
     enabled: bool
     min_upvotes: int
     min_comments: int
+    weight: float = 1.0
+    min_posts: int = 0
+    max_posts: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -83,6 +183,12 @@ class PreferencesResponse(BaseModel):
         from_attributes = True
 
 
+class RankingPreviewRequest(BaseModel):
+    """What-if ranking of stored candidates with alternative weights."""
+    weights: Optional[Dict[str, float]] = None
+    count: Optional[int] = None
+
+
 class RankedPost(BaseModel):
     """Post with ranking score."""
     post_id: str
@@ -107,3 +213,5 @@ class DigestPost(BaseModel):
     score: int
     num_comments: int
     summary: str
+    input_tokens: Optional[int] = None  # Estimated prompt tokens sent for this post
+    summary_source: str = "ai"  # "extractive" when the LLM failed or missed the digest deadline
@@ -0,0 +1,235 @@
+"""
+Staged digest pipeline.
+
+Posts stream through bounded queues between comment fetching,
+summarization and rendering, each stage with its own worker threads, so
+the summary for one post is generated while comments for the next are
+still downloading.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.ai.summarizer import PostSummarizer
+from app.config import get_settings
+from markupsafe import Markup
+from app.email.templates import render_post_html
+from app.models import DigestPost
+from app.reddit.fetcher import RedditFetcher
+
+# Sentinel telling a stage worker there is no more input
+_DONE = object()
+
+
+class StageStats:
+    """Thread-safe per-stage counters: items, errors, latency and queue depth."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.max_queue_depth = 0
+
+    def record(self, latency: float, error: bool = False):
+        with self._lock:
+            self.processed += 1
+            self.errors += int(error)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def observe_depth(self, depth: int):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'errors': self.errors,
+                'avg_latency_ms': round(1000 * self.total_latency / self.processed, 1) if self.processed else 0.0,
+                'max_latency_ms': round(1000 * self.max_latency, 1),
+                'max_queue_depth': self.max_queue_depth,
+            }
+
+
+class Stage:
+    """
+    Worker threads reading (index, item) pairs from a bounded queue and
+    passing handler results to the next stage. The last worker to finish
+    tells the next stage's workers to stop.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.inbox: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = StageStats()
+        self.next: Optional['Stage'] = None
+        self.results: Dict[int, Any] = {}
+        self._running = self.workers
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def put(self, index: int, item: Any):
+        self.inbox.put((index, item))
+        self.stats.observe_depth(self.inbox.qsize())
+
+    def close(self):
+        for _ in range(self.workers):
+            self.inbox.put(_DONE)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        try:
+            while True:
+                entry = self.inbox.get()
+                if entry is _DONE:
+                    break
+                index, item = entry
+
+                start = time.perf_counter()
+                try:
+                    result = self.handler(item)
+                except Exception as e:
+                    print(f"Error in {self.name} stage: {e}")
+                    self.stats.record(time.perf_counter() - start, error=True)
+                    continue
+                self.stats.record(time.perf_counter() - start)
+
+                if self.next is not None:
+                    self.next.put(index, result)
+                else:
+                    self.results[index] = result
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last and self.next is not None:
+                self.next.close()
+
+
+class DigestResult:
+    """Digest posts in ranking order, their rendered HTML blocks and stage metrics."""
+
+    def __init__(self, posts: List[DigestPost], post_blocks: Optional[List[Markup]], stats: Dict[str, Dict]):
+        self.posts = posts
+        self.post_blocks = post_blocks
+        self.stats = stats
+
+
+class DigestPipeline:
+    """Builds a digest by streaming ranked posts through comment, summary and render stages."""
+
+    def __init__(self, fetcher: RedditFetcher, summarizer: PostSummarizer,
+                 queue_size: Optional[int] = None, comment_workers: Optional[int] = None,
+                 summary_workers: Optional[int] = None, render_workers: Optional[int] = None):
+        settings = get_settings()
+        self.fetcher = fetcher
+        self.summarizer = summarizer
+        self.queue_size = queue_size or settings.pipeline_queue_size
+        self.comment_workers = comment_workers or settings.pipeline_comment_workers
+        # Enough workers for the governor's ceiling; its adaptive limit gates the calls
+        self.summary_workers = summary_workers or summarizer.max_concurrency
+        self.render_workers = render_workers or settings.pipeline_render_workers
+
+    def run(self, count: int, refresh: bool = True, render: bool = True) -> DigestResult:
+        fetch_stats = StageStats()
+        start = time.perf_counter()
+        posts = self.fetcher.get_top_posts(count=count, refresh=refresh)
+        # Stored comments are read up front; the session stays on this thread
+        cached_comments = self.fetcher.get_cached_comments([post.post_id for post in posts])
+        fetch_stats.record(time.perf_counter() - start)
+
+        if not posts:
+            return DigestResult([], [] if render else None, {'fetch': fetch_stats.snapshot()})
+
+        fetched_comments = {}
+        self.summarizer.start_deadline()
+
+        def load_comments(post):
+            comments = cached_comments.get(post.post_id)
+            if comments is None:
+                comments = self.summarizer.fetch_comments(post)
+                fetched_comments[post.post_id] = comments
+            return post, comments
+
+        def summarize(item):
+            post, comments = item
+            summary = self.summarizer.summarize_post(post, comments)
+            return self.summarizer.to_digest_post(post, summary)
+
+        stages = [
+            Stage('comments', load_comments, self.comment_workers, self.queue_size),
+            Stage('summarize', summarize, self.summary_workers, self.queue_size),
+        ]
+        if render:
+            stages.append(Stage('render', lambda post: (post, render_post_html(post)),
+                                self.render_workers, self.queue_size))
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next = next_stage
+
+        for stage in stages:
+            stage.start()
+        for index, post in enumerate(posts):
+            stages[0].put(index, post)
+        stages[0].close()
+        for stage in stages:
+            stage.join()
+
+        results = stages[-1].results
+        digest_posts, post_blocks = [], []
+        for index, post in enumerate(posts):
+            result = results.get(index)
+            if result is None:
+                # A stage failed for this post; fall back to a local summary
+                comments = cached_comments.get(post.post_id) or fetched_comments.get(post.post_id)
+                result = self.summarizer.to_digest_post(post, self.summarizer.fallback_summary(post, comments))
+                if render:
+                    result = (result, render_post_html(result))
+            if render:
+                digest_post, block = result
+                post_blocks.append(block)
+            else:
+                digest_post = result
+            digest_posts.append(digest_post)
+
+        # Persist newly downloaded threads so later runs do not fetch them again
+        self.fetcher.store_comments(fetched_comments)
+        self.summarizer.finish_run(digest_posts)
+        stats = {'fetch': fetch_stats.snapshot()}
+        stats.update((stage.name, stage.stats.snapshot()) for stage in stages)
+        return DigestResult(digest_posts, post_blocks if render else None, stats)
+
+
+def build_digest(fetcher: RedditFetcher, summarizer: PostSummarizer, count: int,
+                 refresh: bool = True, render: bool = True, offline: bool = False) -> DigestResult:
+    """
+    Build a digest, streaming per-post work through DigestPipeline. Batch
+    summarization modes need every post up front, so they run as phases.
+    """
+    if not offline and get_settings().summary_mode != "batch":
+        return DigestPipeline(fetcher, summarizer).run(count, refresh=refresh, render=render)
+
+    posts = fetcher.get_top_posts(count=count, refresh=refresh)
+    if not posts:
+        return DigestResult([], [] if render else None, {})
+
+    comments = fetcher.load_comments(posts)
+    if offline:
+        digest_posts = summarizer.summarize_posts_offline(posts, comments)
+    else:
+        digest_posts = summarizer.summarize_posts(posts, comments)
+    post_blocks = [render_post_html(post) for post in digest_posts] if render else None
+    return DigestResult(digest_posts, post_blocks, {})
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Any, Optional
+from urllib.parse import urlencode
+
+
+class ResponseCache:
+    """
+    On-disk cache of Reddit JSON responses.
+    Stores the ETag/Last-Modified validators per URL so that stale entries
+    can be revalidated with a conditional request instead of a full download.
+    """
+
+    # Stale entries are kept this many TTLs for revalidation, then pruned
+    RETENTION_TTLS = 4
+
+    def __init__(self, directory: str, ttl: float = 900):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any] = None) -> str:
+        """Build a cache key from the URL and its query parameters."""
+        if params:
+            return f"{url}?{urlencode(sorted(params.items()))}"
+        return url
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load a cached entry, or None if missing or unreadable."""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('key') == key else None
+
+    def is_fresh(self, entry: Dict[str, Any]) -> bool:
+        """Whether an entry can be served without contacting Reddit."""
+        return time.time() - entry.get('stored_at', 0) < self.ttl
+
+    def store(self, key: str, body: Any, etag: str = None, last_modified: str = None):
+        """Write an entry atomically so concurrent readers never see partial files."""
+        entry = {
+            'key': key,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': time.time(),
+            'body': body,
+        }
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing response cache: {e}")
+
+    def touch(self, key: str, entry: Dict[str, Any]):
+        """Restart the freshness window after a 304 Not Modified."""
+        self.store(key, entry['body'], entry.get('etag'), entry.get('last_modified'))
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+        """Validator headers for revalidating a stale entry."""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def prune(self, max_age: Optional[float] = None):
+        """Delete entries older than max_age seconds (default: RETENTION_TTLS x ttl)."""
+        if max_age is None:
+            max_age = self.RETENTION_TTLS * self.ttl
+        cutoff = time.time() - max_age
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+@lru_cache()
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None when disabled."""
+    from app.config import get_settings
+    settings = get_settings()
+    if not settings.reddit_cache_dir:
+        return None
+    return ResponseCache(settings.reddit_cache_dir, settings.reddit_cache_ttl_seconds)
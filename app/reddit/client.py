@@ -1,72 +1,158 @@
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import random
+import sys
+import threading
 import time
-from typing import List, Dict, Any
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterator
+from app.reddit.cache import ResponseCache, get_response_cache
+from app.reddit.replay import ResponseRecorder
+from app.stats import Counters
 
 
-class RedditPost:
-    """Wrapper for Reddit post data from JSON API."""
+class SubredditRef:
+    """Lightweight stand-in for a subreddit object exposing display_name."""
 
-    def __init__(self, data: Dict[str, Any]):
-        self._data = data
+    __slots__ = ('display_name',)
 
-    @property
-    def id(self) -> str:
-        return self._data.get('id', '')
+    def __init__(self, name: str):
+        self.display_name = name
 
-    @property
-    def title(self) -> str:
-        return self._data.get('title', '')
 
-    @property
-    def score(self) -> int:
-        return self._data.get('score', 0)
+_subreddit_refs: Dict[str, SubredditRef] = {}
 
-    @property
-    def num_comments(self) -> int:
-        return self._data.get('num_comments', 0)
 
-    @property
-    def upvote_ratio(self) -> float:
-        return self._data.get('upvote_ratio', 0.0)
+def _subreddit_ref(name: str) -> SubredditRef:
+    """Return the shared SubredditRef for a name, so posts don't each carry one."""
+    ref = _subreddit_refs.get(name)
+    if ref is None:
+        ref = _subreddit_refs.setdefault(name, SubredditRef(sys.intern(name)))
+    return ref
 
-    @property
-    def created_utc(self) -> float:
-        return self._data.get('created_utc', 0.0)
 
-    @property
-    def permalink(self) -> str:
-        return self._data.get('permalink', '')
+class RedditPost:
+    """
+    Compact Reddit post parsed from the JSON API.
+    Only the fields used by the fetcher, ranker and summarizer are extracted;
+    the raw payload is not kept alive. `features` holds the ranker's
+    precomputed static signals once the post has been stored.
+    """
 
-    @property
-    def url(self) -> str:
-        return self._data.get('url', '')
+    __slots__ = (
+        'id', 'title', 'score', 'num_comments', 'upvote_ratio', 'created_utc',
+        'permalink', 'url', 'is_self', 'selftext', 'subreddit', 'features',
+    )
 
-    @property
-    def is_self(self) -> bool:
-        return self._data.get('is_self', False)
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data.get('id', '')
+        self.title = data.get('title', '')
+        self.score = data.get('score', 0)
+        self.num_comments = data.get('num_comments', 0)
+        self.upvote_ratio = data.get('upvote_ratio', 0.0)
+        self.created_utc = data.get('created_utc', 0.0)
+        self.permalink = data.get('permalink', '')
+        self.url = data.get('url', '')
+        self.is_self = data.get('is_self', False)
+        self.selftext = data.get('selftext', '')
+        self.subreddit = _subreddit_ref(data.get('subreddit', ''))
+        self.features = None
 
-    @property
-    def selftext(self) -> str:
-        return self._data.get('selftext', '')
 
-    @property
-    def subreddit(self):
-        """Mock subreddit object with display_name."""
-        class Subreddit:
-            def __init__(self, name):
-                self.display_name = name
-        return Subreddit(self._data.get('subreddit', ''))
+class RedditComment:
+    """Compact Reddit comment parsed from the JSON API."""
 
+    __slots__ = ('body', 'score')
 
-class RedditComment:
-    """Wrapper for Reddit comment data."""
+    # Longer bodies never fit the summary prompt, so they are not kept
+    MAX_BODY_CHARS = 4000
 
     def __init__(self, data: Dict[str, Any]):
-        self._data = data
+        self.body = (data.get('body') or '')[:self.MAX_BODY_CHARS]
+        self.score = data.get('score', 0)
+
+
+class RedditFetchError(Exception):
+    """A Reddit request that still failed after all retries."""
+
+    def __init__(self, url: str, reason):
+        super().__init__(f"{url} ({reason})")
+        self.url = url
+        self.reason = reason
 
-    @property
-    def body(self) -> str:
-        return self._data.get('body', '')
+
+class TokenBucket:
+    """
+    Thread-safe token bucket enforcing an overall request budget.
+    Every caller sharing a bucket draws from the same pool of tokens.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self.last_refill:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate: float):
+        """Change the refill rate, keeping tokens accrued at the old rate."""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for the next `seconds`."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.last_refill = self.paused_until
+
+
+REQUEST_STAT_FIELDS = ('requests', 'cache_hits', 'not_modified', 'throttled', 'retried', 'failed')
+
+
+@lru_cache()
+def get_rate_limiter() -> TokenBucket:
+    """Get the process-wide token bucket shared by all Reddit clients."""
+    from app.config import get_settings
+    settings = get_settings()
+    return TokenBucket(settings.reddit_requests_per_second, settings.reddit_burst)
+
+
+@lru_cache()
+def get_request_stats() -> Counters:
+    """Get the process-wide Reddit request counters."""
+    return Counters(REQUEST_STAT_FIELDS)
+
+
+def _header_float(headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
 
 
 class RedditClient:
@@ -75,66 +161,222 @@ class RedditClient:
     Uses Reddit's public JSON endpoints.
     """
 
-    def __init__(self):
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None,
+                 cache: Optional[ResponseCache] = None, pool_size: int = 10,
+                 stats: Optional[Counters] = None):
+        from app.config import get_settings
+        settings = get_settings()
+
         self.headers = {
-            'User-Agent': 'RedditSummarizer/1.0 (Educational project)'
+            'User-Agent': 'RedditSummarizer/1.0 (Educational project)',
+            'Accept-Encoding': 'gzip, deflate',
         }
-        self.base_url = 'https://www.reddit.com'
-        self.last_request_time = 0
-        self.min_request_interval = 1.0  # Rate limiting: 1 request per second
+        self.base_url = settings.reddit_base_url.rstrip('/')
+        self.recorder = ResponseRecorder(settings.reddit_record_dir) if settings.reddit_record_dir else None
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.cache = cache if cache is not None else get_response_cache()
+        self.stats = stats or get_request_stats()
+        self.session = self._build_session(pool_size)
+        self.max_rate = settings.reddit_max_requests_per_second
+        self.max_retries = settings.reddit_max_retries
+        self.backoff_base = settings.reddit_backoff_base_seconds
+        self.backoff_max = settings.reddit_backoff_max_seconds
+
+    def _build_session(self, pool_size: int) -> requests.Session:
+        """Create a keep-alive session with a connection pool sized for concurrent fetches."""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
 
     def _rate_limit(self):
-        """Simple rate limiting to respect Reddit's limits."""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_request_interval:
-            time.sleep(self.min_request_interval - elapsed)
-        self.last_request_time = time.time()
-
-    def _make_request(self, url: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Make a request to Reddit with rate limiting."""
-        self._rate_limit()
+        """Wait for a token from the shared bucket to respect Reddit's limits."""
+        self.rate_limiter.acquire()
+
+    def _adapt_rate(self, headers):
+        """
+        Pace the shared bucket to the budget Reddit reports.
+        X-Ratelimit-Remaining requests are spread over the X-Ratelimit-Reset
+        seconds left in the window; an exhausted budget pauses until reset.
+        """
+        remaining = _header_float(headers, 'X-Ratelimit-Remaining')
+        reset = _header_float(headers, 'X-Ratelimit-Reset')
+        if remaining is None or reset is None:
+            return
+
+        if remaining < 1:
+            self.rate_limiter.pause(reset)
+            return
+
+        rate = min(remaining / max(reset, 1.0), self.max_rate)
+        self.rate_limiter.set_rate(max(rate, 0.01))
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Jittered exponential backoff, never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.backoff_base))
+        return delay
+
+    def _make_request(self, url: str, params: Dict[str, Any] = None, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Make a request to Reddit with rate limiting.
+        Fresh cached responses are served locally; stale ones are revalidated
+        with a conditional request. Requests whose URL is unlikely to repeat
+        pass use_cache=False. Raises RedditFetchError once retries run out.
+        """
+        # Ask for unescaped text; the email template does its own HTML escaping
+        params = dict(params or {}, raw_json=1)
+        cache = self.cache if use_cache else None
+        key = ResponseCache.make_key(url, params) if cache else None
+        entry = cache.get(key) if cache else None
+        if entry and cache.is_fresh(entry):
+            self.stats.incr('cache_hits')
+            return entry['body']
+
+        conditional = ResponseCache.conditional_headers(entry) if entry else None
+
+        for attempt in range(self.max_retries + 1):
+            self._rate_limit()
+            self.stats.incr('requests')
+
+            try:
+                response = self.session.get(url, params=params, headers=conditional, timeout=10)
+            except requests.exceptions.RequestException as e:
+                error = e
+                retry_after = None
+            else:
+                self._adapt_rate(response.headers)
+
+                if response.status_code not in self.RETRY_STATUSES:
+                    break
+
+                error = f"HTTP {response.status_code}"
+                retry_after = _header_float(response.headers, 'Retry-After')
+                if response.status_code == 429:
+                    self.stats.incr('throttled')
+                    if retry_after is not None:
+                        self.rate_limiter.pause(retry_after)
+
+            if attempt == self.max_retries:
+                self.stats.incr('failed')
+                raise RedditFetchError(url, f"{error} after {attempt + 1} attempts")
+
+            self.stats.incr('retried')
+            time.sleep(self._backoff_delay(attempt, retry_after))
 
         try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            if response.status_code == 304 and entry:
+                self.stats.incr('not_modified')
+                cache.touch(key, entry)
+                return entry['body']
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching from Reddit: {e}")
-            return {'data': {'children': []}}
+            data = response.json()
+            if self.recorder:
+                self.recorder.record(url, params, data)
+            if cache:
+                cache.store(
+                    key, data,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
+            return data
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.stats.incr('failed')
+            raise RedditFetchError(url, e) from e
+
+    def get_stats(self) -> Dict[str, int]:
+        """Request counters shared by all clients in this process."""
+        return self.stats.snapshot()
 
     def get_subreddit(self, subreddit_name: str):
         """Get subreddit instance (for compatibility)."""
         return subreddit_name
 
+    def iter_listing(self, subreddit_name: str, sort: str = "hot", limit: Optional[int] = None,
+                     min_score: Optional[int] = None, max_age_hours: Optional[float] = None,
+                     time_filter: Optional[str] = None, page_size: int = 100) -> Iterator[RedditPost]:
+        """
+        Stream posts from a subreddit listing, following Reddit's `after` cursor.
+        Each page is yielded as it arrives. Iteration stops after `limit` posts,
+        when the listing is exhausted, or after a page in which no post meets
+        the min_score / max_age_hours cutoff.
+        """
+        url = f'{self.base_url}/r/{subreddit_name}/{sort}.json'
+        cutoff = time.time() - max_age_hours * 3600 if max_age_hours else None
+        after = None
+        yielded = 0
+
+        while limit is None or yielded < limit:
+            params = {'limit': page_size if limit is None else min(page_size, limit - yielded)}
+            if time_filter:
+                params['t'] = time_filter
+            if after:
+                params['after'] = after
+                params['count'] = yielded
+
+            listing = self._make_request(url, params).get('data', {})
+            children = listing.get('children', [])
+            if not children:
+                return
+
+            page_has_candidates = False
+            for child in children:
+                post = RedditPost(child['data'])
+                if ((min_score is None or post.score >= min_score) and
+                        (cutoff is None or post.created_utc >= cutoff)):
+                    page_has_candidates = True
+
+                yield post
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+
+            after = listing.get('after')
+            if not after or not page_has_candidates:
+                return
+
     def get_hot_posts(self, subreddit_name: str, limit: int = 100):
         """Fetch hot posts from a subreddit."""
-        url = f'{self.base_url}/r/{subreddit_name}/hot.json'
-        params = {'limit': min(limit, 100)}
-
-        data = self._make_request(url, params)
-        posts = [RedditPost(child['data']) for child in data.get('data', {}).get('children', [])]
-
-        return posts
+        return list(self.iter_listing(subreddit_name, "hot", limit=limit))
 
     def get_top_posts(self, subreddit_name: str, time_filter: str = "day", limit: int = 100):
         """Fetch top posts from a subreddit."""
-        url = f'{self.base_url}/r/{subreddit_name}/top.json'
-        params = {'t': time_filter, 'limit': min(limit, 100)}
-
-        data = self._make_request(url, params)
-        posts = [RedditPost(child['data']) for child in data.get('data', {}).get('children', [])]
-
-        return posts
-
-    def get_post_comments(self, post, limit: int = 10) -> List[RedditComment]:
-        """Get top comments from a post."""
+        return list(self.iter_listing(subreddit_name, "top", limit=limit, time_filter=time_filter))
+
+    def get_posts_by_ids(self, post_ids: List[str]) -> Iterator[RedditPost]:
+        """
+        Fetch current data for posts by ID, 100 per request.
+        Not cached: the ID list changes between runs, so entries would never be read again.
+        """
+        url = f'{self.base_url}/api/info.json'
+        for start in range(0, len(post_ids), 100):
+            fullnames = ','.join(f't3_{post_id}' for post_id in post_ids[start:start + 100])
+            data = self._make_request(url, {'id': fullnames}, use_cache=False)
+            for child in data.get('data', {}).get('children', []):
+                yield RedditPost(child['data'])
+
+    def get_post_comments(self, post, limit: int = 10, sort: str = 'top') -> List[RedditComment]:
+        """
+        Get top comments from a post.
+        Asks Reddit for only the top-level slice that is used: `limit`
+        comments, `sort` order, no replies.
+        """
         if isinstance(post, RedditPost):
             url = f'{self.base_url}{post.permalink}.json'
         else:
             # Fallback if post object is different
             return []
 
-        params = {'limit': limit}
+        params = {'limit': limit, 'depth': 1, 'sort': sort}
         data = self._make_request(url, params)
 
         # Comments are in the second element of the response
@@ -150,6 +392,14 @@ class RedditClient:
 
         return comments
 
+    async def aget_post_comments(self, post, limit: int = 10) -> List[RedditComment]:
+        """
+        Async variant of get_post_comments.
+        Runs the request on a worker thread so it shares the pooled session
+        and the process-wide rate limit.
+        """
+        return await asyncio.to_thread(self.get_post_comments, post, limit)
+
 
 def get_reddit_client() -> RedditClient:
     """Get Reddit client instance."""
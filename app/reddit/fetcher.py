@@ -1,99 +1,570 @@
-from typing import List
+import hashlib
+import itertools
+import json
+import time
+import zlib
+from typing import Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.reddit.client import RedditClient
+from sqlalchemy.dialects import postgresql, sqlite
+from app.reddit.client import RedditClient, RedditPost, RedditComment, RedditFetchError
 from app.reddit.ranking import PostRanker
-from app.models import Subreddit, PostCache, RankedPost
+from app.reddit.snapshots import SnapshotStore
+from app.models import Subreddit, PostCache, CommentCache, FetchState, RankedPost, chunked
+from app.config import get_settings
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+# Dialects with native INSERT ... ON CONFLICT support
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+class FetchPlan:
+    """Network work for one subreddit, prepared before fanning out to threads."""
+
+    __slots__ = ('name', 'min_upvotes', 'min_comments', 'since', 'refresh_ids')
+
+    def __init__(self, name: str, min_upvotes: int, min_comments: int):
+        self.name = name
+        self.min_upvotes = min_upvotes
+        self.min_comments = min_comments
+        self.since = None
+        self.refresh_ids = []
+
+    @property
+    def incremental(self) -> bool:
+        return self.since is not None
 
 
 class RedditFetcher:
     """Fetches and processes Reddit posts."""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, concurrency: int = None):
         self.db = db
-        self.client = RedditClient()
+        self.concurrency = concurrency or get_settings().reddit_fetch_concurrency
+        self.client = RedditClient(pool_size=max(self.concurrency, 1))
         self.ranker = PostRanker()
+        self.snapshots = SnapshotStore(db)
 
     def get_active_subreddits(self) -> List[Subreddit]:
         """Get list of enabled subreddits."""
         return self.db.query(Subreddit).filter(Subreddit.enabled == True).all()
 
-    def fetch_posts_from_subreddit(self, subreddit: Subreddit, limit: int = 100):
-        """Fetch posts from a single subreddit."""
+    def _age_cutoff(self, hours: float = None) -> float:
+        """Oldest created_utc a candidate may have, or None for no limit."""
+        hours = hours or get_settings().max_post_age_hours
+        return time.time() - hours * 3600 if hours else None
+
+    def _fetch_listing(self, name: str, min_upvotes: int, limit: int = None) -> List:
+        """
+        Stream a subreddit's full hot listing.
+        Touches only the network, so it is safe to run in a worker thread.
+        """
+        settings = get_settings()
+        return list(self.client.iter_listing(
+            name, "hot", limit=limit or settings.reddit_listing_limit,
+            min_score=min_upvotes, max_age_hours=settings.max_post_age_hours
+        ))
+
+    def _fetch_new(self, name: str, since: float) -> List:
+        """
+        Page the new listing until it reaches the `since` watermark, so no
+        post newer than the watermark is skipped however busy the subreddit.
+        """
+        hours_since = max(time.time() - since, 0) / 3600
+        posts = self.client.iter_listing(name, "new", max_age_hours=max(hours_since, 1 / 60))
+        # The listing is newest first; stop reading pages at the watermark
+        return list(itertools.takewhile(lambda post: post.created_utc > since, posts))
+
+    def _plan(self, subreddit: Subreddit, state: Optional[FetchState]) -> FetchPlan:
+        """
+        Decide how to fetch a subreddit.
+        With a watermark and a full relisting within FETCH_FULL_REFRESH_HOURS,
+        only newer posts are listed, and stored candidates inside the refresh
+        window are rescored by ID, least recently refreshed first so repeated
+        runs rotate through all of them.
+        """
+        settings = get_settings()
+        plan = FetchPlan(subreddit.name, subreddit.min_upvotes, subreddit.min_comments)
+
+        if not (settings.incremental_fetch and state and state.newest_created_utc and state.last_full_fetch_at):
+            return plan
+        if datetime.utcnow() - state.last_full_fetch_at > timedelta(hours=settings.fetch_full_refresh_hours):
+            return plan
+
+        plan.since = state.newest_created_utc
+        rows = self.db.query(PostCache.post_id).filter(
+            self._same_subreddit(subreddit.name),
+            PostCache.sent == False,
+            PostCache.created_utc >= self._age_cutoff(settings.fetch_refresh_window_hours)
+        ).order_by(PostCache.fetched_at.asc()).limit(settings.fetch_refresh_limit)
+        plan.refresh_ids = [row.post_id for row in rows]
+        return plan
+
+    def _execute_plan(self, plan: FetchPlan) -> Optional[List]:
+        """
+        Run a plan's network requests. Safe to run in a worker thread.
+        Returns None when the subreddit could not be fetched.
+        """
         try:
-            # Fetch hot posts
-            posts = self.client.get_hot_posts(subreddit.name, limit=limit)
-
-            # Filter by minimum thresholds
-            filtered = []
-            for post in posts:
-                if (post.score >= subreddit.min_upvotes and
-                    post.num_comments >= subreddit.min_comments):
-                    # Check if not already sent
-                    existing = self.db.query(PostCache).filter(
-                        PostCache.post_id == post.id,
-                        PostCache.sent == True
-                    ).first()
-
-                    if not existing:
-                        filtered.append(post)
-
-            return filtered
+            if not plan.incremental:
+                return self._fetch_listing(plan.name, plan.min_upvotes)
+            posts = self._fetch_new(plan.name, plan.since)
+            posts.extend(self.client.get_posts_by_ids(plan.refresh_ids))
+            return posts
+        except RedditFetchError as e:
+            print(f"Failed to fetch r/{plan.name}; using stored candidates: {e}")
+            return None
         except Exception as e:
-            print(f"Error fetching from r/{subreddit.name}: {e}")
+            print(f"Error fetching from r/{plan.name}: {e}")
+            return None
+
+    @staticmethod
+    def _same_subreddit(name: str):
+        """Match cached posts by subreddit; Reddit's display_name casing may differ from ours."""
+        return func.lower(PostCache.subreddit) == name.lower()
+
+    @staticmethod
+    def _features_hash(post) -> str:
+        """Fingerprint of the inputs to the title and content-type features."""
+        content = f"{post.is_self}\0{post.title}\0{post.selftext}"
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+    def _attach_features(self, posts: List):
+        """
+        Attach ranking features to fetched posts.
+        Stored title/content features are reused while the post's text is
+        unchanged; engagement follows the current score and comment count.
+        """
+        stored = {}
+        ids = [post.id for post in posts]
+        for chunk in chunked(ids):
+            rows = self.db.query(
+                PostCache.post_id, PostCache.features_hash,
+                PostCache.title_quality, PostCache.content_score
+            ).filter(PostCache.post_id.in_(chunk))
+            stored.update((row.post_id, row) for row in rows)
+
+        for post in posts:
+            row = stored.get(post.id)
+            if (row is not None and row.title_quality is not None and
+                    row.features_hash == self._features_hash(post)):
+                engagement = self.ranker.calculate_engagement_quality(post)
+                post.features = (row.title_quality, row.content_score, engagement)
+            else:
+                post.features = self.ranker.precompute_features(post)
+
+    def _post_row(self, post) -> dict:
+        title_quality, content_score, engagement = post.features or self.ranker.precompute_features(post)
+        return {
+            'post_id': post.id,
+            'subreddit': post.subreddit.display_name,
+            'title': post.title,
+            'score': post.score,
+            'num_comments': post.num_comments,
+            'url': f"https://reddit.com{post.permalink}",
+            'permalink': post.permalink,
+            'upvote_ratio': post.upvote_ratio,
+            'is_self': post.is_self,
+            'selftext': post.selftext,
+            'title_quality': title_quality,
+            'content_score': content_score,
+            'engagement': engagement,
+            'features_hash': self._features_hash(post),
+            'created_utc': post.created_utc,
+            'fetched_at': datetime.utcnow(),
+            'sent': False,
+        }
+
+    @staticmethod
+    def _post_from_cache(cached: PostCache) -> RedditPost:
+        post = RedditPost({
+            'id': cached.post_id,
+            'subreddit': cached.subreddit,
+            'title': cached.title,
+            'score': cached.score,
+            'num_comments': cached.num_comments,
+            'permalink': cached.permalink or '',
+            'url': cached.url,
+            'upvote_ratio': cached.upvote_ratio or 0.0,
+            'is_self': bool(cached.is_self),
+            'selftext': cached.selftext or '',
+            'created_utc': cached.created_utc,
+        })
+        if None not in (cached.title_quality, cached.content_score, cached.engagement):
+            post.features = (cached.title_quality, cached.content_score, cached.engagement)
+        return post
+
+    def _store_posts(self, posts: List):
+        """Upsert fetched posts so later runs can rescore them without relisting."""
+        if posts:
+            self._attach_features(posts)
+            self._upsert_cache_rows(
+                [self._post_row(post) for post in posts],
+                refresh=[
+                    'score', 'num_comments', 'upvote_ratio', 'title', 'selftext',
+                    'title_quality', 'content_score', 'engagement', 'features_hash', 'fetched_at',
+                ]
+            )
+            self.snapshots.record(posts)
+
+    def _update_fetch_state(self, name: str, state: Optional[FetchState], posts: Optional[List],
+                            full: bool = False):
+        """
+        Advance the subreddit's high-water mark to the newest post seen.
+        `full` marks a full hot relisting, which restarts the incremental period.
+        A failed fetch (posts is None) leaves the state untouched, so the
+        subreddit does not look freshly crawled.
+        """
+        if posts is None:
+            return
+        if state is None:
+            state = FetchState(subreddit=name)
+            self.db.add(state)
+
+        newest = max(posts, key=lambda post: post.created_utc, default=None)
+        if newest is not None and newest.created_utc > (state.newest_created_utc or 0):
+            state.newest_created_utc = newest.created_utc
+            state.newest_fullname = f"t3_{newest.id}"
+        state.last_fetched_at = datetime.utcnow()
+        if full:
+            state.last_full_fetch_at = state.last_fetched_at
+
+    def _stored_candidates(self, subreddit: Subreddit) -> List:
+        """Unsent stored posts in the refresh window that meet the thresholds."""
+        settings = get_settings()
+        cutoff = self._age_cutoff(settings.fetch_refresh_window_hours)
+        max_age_cutoff = self._age_cutoff()
+        if max_age_cutoff is not None:
+            cutoff = max(cutoff, max_age_cutoff)
+
+        rows = self.db.query(PostCache).filter(
+            self._same_subreddit(subreddit.name),
+            PostCache.sent == False,
+            PostCache.created_utc >= cutoff,
+            PostCache.score >= subreddit.min_upvotes,
+            PostCache.num_comments >= subreddit.min_comments
+        )
+        return [self._post_from_cache(row) for row in rows]
+
+    def _filter_candidates(self, subreddit: Subreddit, posts: List) -> List:
+        """Keep fetched posts that meet the thresholds and were not sent yet."""
+        cutoff = self._age_cutoff()
+        passing = [
+            post for post in posts
+            if post.score >= subreddit.min_upvotes and post.num_comments >= subreddit.min_comments
+            and (cutoff is None or post.created_utc >= cutoff)
+        ]
+        return self._exclude_sent(passing)
+
+    def _sent_post_ids(self, post_ids: List[str]) -> Set[str]:
+        """Return which of the given post IDs were already sent, in bulk lookups."""
+        sent = set()
+        for chunk in chunked(post_ids):
+            rows = self.db.query(PostCache.post_id).filter(
+                PostCache.post_id.in_(chunk),
+                PostCache.sent == True
+            )
+            sent.update(row.post_id for row in rows)
+        return sent
+
+    def _exclude_sent(self, posts: List) -> List:
+        """Drop posts that were already sent in a previous digest."""
+        if not posts:
             return []
 
+        sent = self._sent_post_ids([post.id for post in posts])
+        return [post for post in posts if post.id not in sent]
+
+    def _fetch_subreddits(self, subreddits: List[Subreddit]) -> List:
+        """
+        Fetch candidates for the given subreddits.
+        Network requests run concurrently; the client's shared token bucket
+        still caps the overall request rate. Database work stays on this thread.
+        """
+        if not subreddits:
+            return []
+
+        states = {
+            state.subreddit: state
+            for state in self.db.query(FetchState).filter(
+                FetchState.subreddit.in_([s.name for s in subreddits])
+            )
+        }
+        plans = [self._plan(subreddit, states.get(subreddit.name)) for subreddit in subreddits]
+        workers = max(1, min(self.concurrency, len(plans)))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self._execute_plan, plans))
+
+        for subreddit, plan, posts in zip(subreddits, plans, results):
+            if posts is not None:
+                self._store_posts(posts)
+            self._update_fetch_state(subreddit.name, states.get(subreddit.name), posts,
+                                     full=not plan.incremental)
+        self.db.commit()
+
+        all_posts = []
+        for subreddit, plan, posts in zip(subreddits, plans, results):
+            # A failed subreddit falls back to what was stored by earlier fetches
+            if posts is None or plan.incremental:
+                all_posts.extend(self._stored_candidates(subreddit))
+            else:
+                all_posts.extend(self._filter_candidates(subreddit, posts))
+
+        return all_posts
+
+    def fetch_posts_from_subreddit(self, subreddit: Subreddit):
+        """Fetch posts from a single subreddit."""
+        return self._fetch_subreddits([subreddit])
+
     def fetch_all_posts(self) -> List:
         """Fetch posts from all active subreddits."""
-        subreddits = self.get_active_subreddits()
+        return self._fetch_subreddits(self.get_active_subreddits())
+
+    def get_stored_posts(self) -> List:
+        """Candidates for all active subreddits, read from local storage only."""
         all_posts = []
+        for subreddit in self.get_active_subreddits():
+            all_posts.extend(self._stored_candidates(subreddit))
+        return all_posts
 
-        for subreddit in subreddits:
-            posts = self.fetch_posts_from_subreddit(subreddit)
-            all_posts.extend(posts)
+    def last_crawled_at(self) -> Optional[datetime]:
+        """When the least recently fetched active subreddit was last fetched."""
+        names = [s.name for s in self.get_active_subreddits()]
+        if not names:
+            return None
+        states = self.db.query(FetchState).filter(FetchState.subreddit.in_(names)).all()
+        if len(states) < len(names) or any(s.last_fetched_at is None for s in states):
+            return None
+        return min(s.last_fetched_at for s in states)
 
-        return all_posts
+    def rank_stored_posts(self, count: int, weights: Optional[Dict[str, float]] = None) -> List[RankedPost]:
+        """
+        Re-rank stored candidates with alternative weights, without fetching or caching.
+        Uses the stored features, so only velocity and percentile are recomputed.
+        """
+        ranker = PostRanker(weights)
+        posts = self.get_stored_posts()
+        return ranker.select_top_posts(
+            posts, count, velocities=self.snapshots.windowed_velocities(posts),
+            **self._selection_options()
+        )
 
-    def get_top_posts(self, count: int = 12) -> List[RankedPost]:
+    def get_top_posts(self, count: int = 12, refresh: bool = True) -> List[RankedPost]:
         """
         Fetch, rank, and select top posts for digest.
-        Uses round-robin selection for diversity.
+        Uses round-robin selection for diversity. With refresh=False the
+        candidates come from what the background crawler already stored.
         """
         # Fetch all posts
-        all_posts = self.fetch_all_posts()
+        all_posts = self.fetch_all_posts() if refresh else self.get_stored_posts()
 
         if not all_posts:
             return []
 
-        # Rank posts
-        ranked_posts = self.ranker.rank_posts(all_posts)
-
-        # Select diverse posts using round-robin
-        selected_posts = self.ranker.select_diverse_posts(ranked_posts, count)
+        # Rank posts and select diverse posts using weighted round-robin
+        selected_posts = self.ranker.select_top_posts(
+            all_posts, count, velocities=self.snapshots.windowed_velocities(all_posts),
+            **self._selection_options()
+        )
 
         # Cache posts
-        for post in selected_posts:
-            self._cache_post(post)
+        self.cache_posts(selected_posts)
 
         return selected_posts
 
-    def _cache_post(self, post: RankedPost):
-        """Cache post in database."""
-        existing = self.db.query(PostCache).filter(PostCache.post_id == post.post_id).first()
-
-        if not existing:
-            cached = PostCache(
-                post_id=post.post_id,
-                subreddit=post.subreddit,
-                title=post.title,
-                score=post.score,
-                num_comments=post.num_comments,
-                url=post.url,
-                created_utc=post.created_utc,
-                sent=False
+    def _selection_options(self) -> dict:
+        """Per-subreddit weights and quotas plus the global score floor for selection."""
+        subreddits = self.get_active_subreddits()
+        return {
+            'weights': {s.name: s.weight if s.weight is not None else 1.0 for s in subreddits},
+            'min_quotas': {s.name: s.min_posts or 0 for s in subreddits},
+            'max_quotas': {s.name: s.max_posts for s in subreddits if s.max_posts is not None},
+            'score_floor': get_settings().min_rank_score,
+        }
+
+    def crawl(self, comment_posts: int = None) -> Dict[str, int]:
+        """
+        Background crawl: refresh every subreddit into local storage and
+        prefetch comments for the best current candidates.
+        """
+        settings = get_settings()
+        comment_posts = comment_posts if comment_posts is not None else settings.crawler_comment_posts
+
+        candidates = self.fetch_all_posts()
+        ranked = self.ranker.rank_posts(
+            candidates, limit=comment_posts,
+            velocities=self.snapshots.windowed_velocities(candidates)
+        )
+
+        # Skip threads already fetched during this crawl interval
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.crawler_interval_minutes)
+        recent = {
+            row.post_id for row in self.db.query(CommentCache.post_id).filter(
+                CommentCache.post_id.in_([post.post_id for post in ranked]),
+                CommentCache.fetched_at >= cutoff
             )
-            self.db.add(cached)
-            self.db.commit()
+        }
+        by_id = {post.id: post for post in candidates}
+        to_fetch = [by_id[post.post_id] for post in ranked if post.post_id not in recent]
+        self.prefetch_comments(to_fetch)
+        self.snapshots.compact()
+        if self.client.cache:
+            self.client.cache.prune()
+
+        return {'candidates': len(candidates), 'comments_fetched': len(to_fetch)}
+
+    def prefetch_comments(self, posts: List, limit: Optional[int] = None):
+        """Fetch comment threads concurrently and store them for the digest."""
+        if not posts:
+            return
+
+        limit = limit or get_settings().summary_comment_candidates
+
+        def fetch(post):
+            try:
+                return self.client.get_post_comments(post, limit=limit)
+            except RedditFetchError as e:
+                print(f"Error fetching comments for {post.id}: {e}")
+                return []
+
+        workers = max(1, min(self.concurrency, len(posts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            threads = list(executor.map(fetch, posts))
+
+        self.store_comments({post.id: comments for post, comments in zip(posts, threads)})
+
+    @staticmethod
+    def _pack_comments(comments: List[RedditComment]) -> bytes:
+        payload = json.dumps([{'body': c.body, 'score': c.score} for c in comments], separators=(',', ':'))
+        return zlib.compress(payload.encode('utf-8'))
+
+    @staticmethod
+    def _unpack_comments(row: CommentCache) -> List[RedditComment]:
+        if row.payload is not None:
+            data = json.loads(zlib.decompress(row.payload))
+        else:
+            data = json.loads(row.comments or '[]')
+        return [RedditComment(comment) for comment in data]
+
+    def store_comments(self, threads: Dict[str, List[RedditComment]]):
+        """
+        Persist fetched comment threads, compressed, replacing older copies.
+        Empty threads are skipped since failed fetches also come back empty.
+        """
+        threads = {post_id: comments for post_id, comments in threads.items() if comments}
+        if not threads:
+            return
+
+        existing = {}
+        ids = list(threads)
+        for chunk in chunked(ids):
+            for cached in self.db.query(CommentCache).filter(CommentCache.post_id.in_(chunk)):
+                existing[cached.post_id] = cached
+
+        now = datetime.utcnow()
+        for post_id, comments in threads.items():
+            payload = self._pack_comments(comments)
+            cached = existing.get(post_id)
+            if cached is None:
+                self.db.add(CommentCache(post_id=post_id, payload=payload, fetched_at=now))
+            else:
+                cached.payload = payload
+                cached.comments = None
+                cached.fetched_at = now
+        self.db.commit()
+
+    def get_cached_comments(self, post_ids: List[str]) -> Dict[str, List[RedditComment]]:
+        """Stored comments for the given posts fetched within COMMENT_CACHE_TTL_HOURS, keyed by post ID."""
+        cutoff = datetime.utcnow() - timedelta(hours=get_settings().comment_cache_ttl_hours)
+        cached = {}
+        for chunk in chunked(post_ids):
+            rows = self.db.query(CommentCache).filter(
+                CommentCache.post_id.in_(chunk),
+                CommentCache.fetched_at >= cutoff
+            )
+            for row in rows:
+                cached[row.post_id] = self._unpack_comments(row)
+        return cached
+
+    def load_comments(self, posts: List[RankedPost]) -> Dict[str, List[RedditComment]]:
+        """Comments for ranked posts: stored threads first, then fetch and store the rest."""
+        comments = self.get_cached_comments([post.post_id for post in posts])
+        missing = [
+            RedditPost({'id': post.post_id, 'permalink': urlsplit(post.url).path})
+            for post in posts if post.post_id not in comments
+        ]
+        if missing:
+            self.prefetch_comments(missing)
+            comments.update(self.get_cached_comments([post.id for post in missing]))
+        return comments
+
+    def _upsert_cache_rows(self, rows: List[dict], refresh: List[str]):
+        """
+        Insert cache rows, updating the `refresh` columns on rows that already exist.
+        Uses the dialect's native INSERT ... ON CONFLICT where available.
+        """
+        # A multi-row ON CONFLICT statement may not touch the same row twice
+        rows = list({row['post_id']: row for row in rows}.values())
+
+        dialect = self.db.get_bind().dialect.name
+        insert = UPSERT_INSERTS.get(dialect)
+
+        if insert is not None:
+            stmt = insert(PostCache)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[PostCache.post_id],
+                set_={column: stmt.excluded[column] for column in refresh}
+            )
+            self.db.execute(stmt, rows)
+            return
+
+        # Generic fallback: one bulk lookup, then update or add in the same transaction
+        ids = [row['post_id'] for row in rows]
+        existing = {}
+        for chunk in chunked(ids):
+            for cached in self.db.query(PostCache).filter(PostCache.post_id.in_(chunk)):
+                existing[cached.post_id] = cached
+
+        for row in rows:
+            cached = existing.get(row['post_id'])
+            if cached is None:
+                cached = PostCache(**row)
+                existing[row['post_id']] = cached
+                self.db.add(cached)
+            else:
+                for column in refresh:
+                    setattr(cached, column, row[column])
+
+    def cache_posts(self, posts: List[RankedPost]):
+        """Cache posts in one transaction, refreshing score and comment counts of known posts."""
+        if not posts:
+            return
+
+        rows = [
+            {
+                'post_id': post.post_id,
+                'subreddit': post.subreddit,
+                'title': post.title,
+                'score': post.score,
+                'num_comments': post.num_comments,
+                'url': post.url,
+                'created_utc': post.created_utc,
+                'sent': False,
+            }
+            for post in posts
+        ]
+        self._upsert_cache_rows(rows, refresh=['score', 'num_comments'])
+        self.db.commit()
+
+    def _cache_post(self, post: RankedPost):
+        """Cache a single post in the database."""
+        self.cache_posts([post])
 
     def mark_posts_as_sent(self, post_ids: List[str]):
         """Mark posts as sent in cache."""
@@ -107,4 +578,10 @@ class RedditFetcher:
         """Remove old cached posts."""
         cutoff = datetime.utcnow() - timedelta(days=days)
         self.db.query(PostCache).filter(PostCache.fetched_at < cutoff).delete()
+        self.db.query(CommentCache).filter(CommentCache.fetched_at < cutoff).delete()
         self.db.commit()
+
+        self.snapshots.compact()
+
+        if self.client.cache:
+            self.client.cache.prune()
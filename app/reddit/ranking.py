@@ -1,5 +1,7 @@
+import heapq
 import time
-from typing import List
+from array import array
+from typing import Dict, List, Optional, Tuple
 from app.models import RankedPost
 import math
 
@@ -7,8 +9,9 @@ import math
 class PostRanker:
     """Ranks Reddit posts using custom algorithm."""
 
-    def __init__(self):
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
         self.current_time = time.time()
+        self.weights = {**self.WEIGHTS, **(weights or {})}
 
     def calculate_velocity(self, post) -> float:
         """
@@ -99,6 +102,28 @@ class PostRanker:
             # Link post
             return 0.4
 
+    WEIGHTS = {
+        'velocity': 0.25,
+        'engagement': 0.20,
+        'approval': 0.20,
+        'percentile': 0.15,
+        'title': 0.10,
+        'content': 0.10
+    }
+
+    def _combine(self, velocity_normalized: float, engagement: float, approval: float,
+                 percentile: float, title_quality: float, content_score: float) -> float:
+        """Weighted combination of the individual ranking signals."""
+        weights = self.weights
+        return (
+            weights['velocity'] * velocity_normalized +
+            weights['engagement'] * engagement +
+            weights['approval'] * approval +
+            weights['percentile'] * percentile +
+            weights['title'] * title_quality +
+            weights['content'] * content_score
+        )
+
     def rank_post(self, post, all_posts: List) -> float:
         """
         Calculate overall rank score for a post.
@@ -115,86 +140,238 @@ class PostRanker:
         # Normalize velocity (log scale to handle wide range)
         velocity_normalized = min(math.log10(velocity + 1) / 4, 1.0)
 
-        # Weighted combination
-        weights = {
-            'velocity': 0.25,
-            'engagement': 0.20,
-            'approval': 0.20,
-            'percentile': 0.15,
-            'title': 0.10,
-            'content': 0.10
-        }
-
-        rank_score = (
-            weights['velocity'] * velocity_normalized +
-            weights['engagement'] * engagement +
-            weights['approval'] * approval +
-            weights['percentile'] * percentile +
-            weights['title'] * title_quality +
-            weights['content'] * content_score
+        return self._combine(
+            velocity_normalized, engagement, approval, percentile, title_quality, content_score
+        )
+
+    def calculate_percentiles(self, subreddits: List[str], scores: List[int]) -> List[float]:
+        """
+        Percentile of every post within its subreddit, from one sort per group.
+        Matches calculate_popularity_percentile: ties take the position of
+        the first equal score.
+        """
+        groups = {}
+        for i, name in enumerate(subreddits):
+            groups.setdefault(name, []).append(i)
+
+        percentiles = array('d', bytes(8 * len(scores)))
+        for indices in groups.values():
+            ordered = sorted((scores[i] for i in indices), reverse=True)
+            first_position = {}
+            for position, score in enumerate(ordered):
+                first_position.setdefault(score, position)
+            size = len(ordered)
+            for i in indices:
+                percentiles[i] = 1 - (first_position[scores[i]] / size)
+
+        return percentiles
+
+    def precompute_features(self, post) -> Tuple[float, float, float]:
+        """
+        Signals that don't depend on the clock or the candidate set:
+        (title_quality, content_score, engagement). Computed at ingest and
+        stored so re-ranking only recomputes velocity and percentile.
+        """
+        return (
+            self.calculate_title_quality(post.title),
+            self.calculate_content_type_score(post),
+            self.calculate_engagement_quality(post),
         )
 
-        return rank_score
+    def rank_batch(self, posts: List, velocities: Optional[Dict[str, float]] = None) -> List[float]:
+        """
+        Rank scores for all posts at once, in input order.
+        Works on columns and sorts each subreddit once, so a batch costs
+        O(n log n) instead of O(n^2 log n), with the same scores as rank_post.
+        Precomputed features on a post are used instead of recomputing them,
+        and measured `velocities` (upvotes/hour by post ID) replace the
+        lifetime estimate where available.
+        """
+        velocities = velocities or {}
+        scores = [post.score for post in posts]
+        comments = [post.num_comments for post in posts]
+        created = array('d', (post.created_utc for post in posts))
+        subreddits = [post.subreddit.display_name for post in posts]
+        percentiles = self.calculate_percentiles(subreddits, scores)
+
+        rank_scores = []
+        for i, post in enumerate(posts):
+            # Velocity, normalized on a log scale
+            velocity = velocities.get(post.id)
+            if velocity is None:
+                age_hours = (self.current_time - created[i]) / 3600
+                if age_hours < 0.1:
+                    age_hours = 0.1
+                velocity = scores[i] / age_hours
+            velocity_normalized = min(math.log10(velocity + 1) / 4, 1.0)
+
+            approval = post.upvote_ratio if hasattr(post, 'upvote_ratio') else 0.5
+
+            features = getattr(post, 'features', None)
+            if features is not None:
+                title_quality, content_score, engagement = features
+            else:
+                title_quality = self.calculate_title_quality(post.title)
+                content_score = self.calculate_content_type_score(post)
+                # Engagement quality
+                if scores[i] == 0:
+                    engagement = 0
+                else:
+                    engagement = min(comments[i] / scores[i] * 10, 1.0)
+
+            rank_scores.append(self._combine(
+                velocity_normalized, engagement, approval, percentiles[i],
+                title_quality, content_score
+            ))
+
+        return rank_scores
+
+    def _to_ranked_post(self, post, score: float) -> RankedPost:
+        """Materialize the API model for one ranked post."""
+        return RankedPost(
+            post_id=post.id,
+            subreddit=post.subreddit.display_name,
+            title=post.title,
+            url=f"https://reddit.com{post.permalink}",
+            score=post.score,
+            num_comments=post.num_comments,
+            upvote_ratio=post.upvote_ratio if hasattr(post, 'upvote_ratio') else 0.0,
+            created_utc=post.created_utc,
+            rank_score=score,
+            selftext=post.selftext if hasattr(post, 'selftext') else None,
+            is_self=post.is_self
+        )
 
-    def rank_posts(self, posts: List) -> List[RankedPost]:
+    def rank_posts(self, posts: List, limit: Optional[int] = None,
+                   velocities: Optional[Dict[str, float]] = None) -> List[RankedPost]:
         """
         Rank a list of posts and return sorted by score.
+        With a limit, only the top `limit` posts are selected and materialized.
         """
+        self.current_time = time.time()
         posts_list = list(posts)  # Convert generator to list
-        ranked = []
+        scores = self.rank_batch(posts_list, velocities)
 
-        for post in posts_list:
-            score = self.rank_post(post, posts_list)
-
-            ranked_post = RankedPost(
-                post_id=post.id,
-                subreddit=post.subreddit.display_name,
-                title=post.title,
-                url=f"https://reddit.com{post.permalink}",
-                score=post.score,
-                num_comments=post.num_comments,
-                upvote_ratio=post.upvote_ratio if hasattr(post, 'upvote_ratio') else 0.0,
-                created_utc=post.created_utc,
-                rank_score=score,
-                selftext=post.selftext if hasattr(post, 'selftext') else None,
-                is_self=post.is_self
-            )
-            ranked.append(ranked_post)
-
-        # Sort by rank score descending
-        ranked.sort(key=lambda x: x.rank_score, reverse=True)
+        # Sort by rank score descending; ties keep input order
+        if limit is None:
+            order = sorted(range(len(posts_list)), key=scores.__getitem__, reverse=True)
+        else:
+            order = heapq.nlargest(limit, range(len(posts_list)), key=scores.__getitem__)
 
-        return ranked
+        return [self._to_ranked_post(posts_list[i], scores[i]) for i in order]
 
-    def select_diverse_posts(self, ranked_posts: List[RankedPost], count: int) -> List[RankedPost]:
+    def select_top_posts(self, posts: List, count: int,
+                         weights: Optional[Dict[str, float]] = None,
+                         min_quotas: Optional[Dict[str, int]] = None,
+                         max_quotas: Optional[Dict[str, int]] = None,
+                         score_floor: Optional[float] = None,
+                         velocities: Optional[Dict[str, float]] = None) -> List[RankedPost]:
+        """
+        Rank posts and select a diverse top `count`, in one step.
+        Same result as rank_posts followed by select_diverse_posts, but works
+        on indices and scores: each subreddit keeps only its best `count`
+        candidates, and RankedPost objects are built only for the selection.
+        """
+        self.current_time = time.time()
+        posts_list = list(posts)
+        scores = self.rank_batch(posts_list, velocities)
+        by_rank = scores.__getitem__
+
+        if not self._needs_selection(len(posts_list), count, weights, max_quotas, score_floor):
+            order = sorted(range(len(posts_list)), key=by_rank, reverse=True)
+            return [self._to_ranked_post(posts_list[i], scores[i]) for i in order]
+
+        candidates = {}
+        for i, post in enumerate(posts_list):
+            if score_floor is not None and scores[i] < score_floor:
+                continue
+            candidates.setdefault(post.subreddit.display_name, []).append(i)
+
+        # No subreddit can fill more than `count` slots
+        queues = [
+            (name, heapq.nlargest(count, indices, key=by_rank))
+            for name, indices in candidates.items()
+        ]
+        # Order subreddits by where their best post lands in the full ranking
+        queues.sort(key=lambda queue: (-scores[queue[1][0]], queue[1][0]))
+
+        selected = self.weighted_round_robin(dict(queues), count, weights, min_quotas, max_quotas)
+        return [self._to_ranked_post(posts_list[i], scores[i]) for i in selected]
+
+    def select_diverse_posts(self, ranked_posts: List[RankedPost], count: int,
+                             weights: Optional[Dict[str, float]] = None,
+                             min_quotas: Optional[Dict[str, int]] = None,
+                             max_quotas: Optional[Dict[str, int]] = None,
+                             score_floor: Optional[float] = None) -> List[RankedPost]:
         """
         Select posts using round-robin to ensure diverse subreddit representation.
+        Subreddits may be given weights (share of picks), minimum and maximum
+        quotas, and posts below score_floor are never selected. With no
+        options this is plain round-robin in order of each subreddit's best post.
         """
-        if len(ranked_posts) <= count:
+        if not self._needs_selection(len(ranked_posts), count, weights, max_quotas, score_floor):
             return ranked_posts
 
-        # Group by subreddit
+        # Group by subreddit, keeping rank order within each group
         by_subreddit = {}
         for post in ranked_posts:
-            if post.subreddit not in by_subreddit:
-                by_subreddit[post.subreddit] = []
-            by_subreddit[post.subreddit].append(post)
-
-        # Round-robin selection
-        selected = []
-        subreddits = list(by_subreddit.keys())
-        index = 0
+            if score_floor is not None and post.rank_score < score_floor:
+                continue
+            by_subreddit.setdefault(post.subreddit, []).append(post)
 
-        while len(selected) < count:
-            current_subreddit = subreddits[index % len(subreddits)]
+        return self.weighted_round_robin(by_subreddit, count, weights, min_quotas, max_quotas)
 
-            if by_subreddit[current_subreddit]:
-                selected.append(by_subreddit[current_subreddit].pop(0))
-
-            index += 1
+    @staticmethod
+    def _needs_selection(available: int, count: int, weights: Optional[Dict[str, float]],
+                         max_quotas: Optional[Dict[str, int]], score_floor: Optional[float]) -> bool:
+        """
+        Whether anything can be left out. Every candidate is kept when they
+        all fit, unless a floor, a maximum quota or a zero weight excludes some.
+        """
+        if available > count or score_floor is not None or max_quotas:
+            return True
+        return any(weight <= 0 for weight in (weights or {}).values())
+
+    @staticmethod
+    def weighted_round_robin(groups: Dict[str, List], count: int,
+                             weights: Optional[Dict[str, float]] = None,
+                             min_quotas: Optional[Dict[str, int]] = None,
+                             max_quotas: Optional[Dict[str, int]] = None) -> List:
+        """
+        k-way merge over per-subreddit queues, each already in rank order.
+        Every pick goes to the subreddit with the smallest key of
+        (still below its minimum quota, picks / weight, first-seen order),
+        so equal weights reproduce plain round-robin. Costs O(count log k)
+        for k subreddits. Quota and weight lookups ignore name casing.
+        """
+        weights = {name.lower(): value for name, value in (weights or {}).items()}
+        min_quotas = {name.lower(): value for name, value in (min_quotas or {}).items()}
+        max_quotas = {name.lower(): value for name, value in (max_quotas or {}).items()}
+
+        heap = []
+        for order, (name, posts) in enumerate(groups.items()):
+            key = name.lower()
+            weight = weights.get(key, 1.0)
+            limit = len(posts)
+            if max_quotas.get(key) is not None:
+                limit = min(limit, max_quotas[key])
+            if weight <= 0 or limit <= 0:
+                continue
+            minimum = min_quotas.get(key) or 0
+            heap.append((0 if minimum > 0 else 1, 0.0, order, name, weight, minimum, limit))
+        heapq.heapify(heap)
 
-            # If we've exhausted all subreddits, break
-            if all(len(posts) == 0 for posts in by_subreddit.values()):
-                break
+        selected = []
+        taken = {}
+        while heap and len(selected) < count:
+            _, _, order, name, weight, minimum, limit = heapq.heappop(heap)
+            picks = taken.get(name, 0)
+            selected.append(groups[name][picks])
+            picks += 1
+            taken[name] = picks
+
+            if picks < limit:
+                tier = 0 if picks < minimum else 1
+                heapq.heappush(heap, (tier, picks / weight, order, name, weight, minimum, limit))
 
         return selected
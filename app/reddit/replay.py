@@ -0,0 +1,203 @@
+"""
+Record/replay support for benchmarking the Reddit fetch path offline.
+
+Record real traffic by setting REDDIT_RECORD_DIR; every successful JSON
+response is written to that directory. Replay it with the stand-in server:
+
+    python -m app.reddit.replay --captures ./captures --port 8765 \\
+        --latency 0.05 --jitter 0.02 --error-rate 0.01
+
+and point the app at it with REDDIT_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+def capture_key(path: str, params: Dict[str, Any] = None) -> str:
+    """Identify a request by its path and sorted query parameters."""
+    query = urlencode(sorted((k, str(v)) for k, v in (params or {}).items()))
+    return f"{path}?{query}" if query else path
+
+
+class ResponseRecorder:
+    """Writes Reddit JSON responses to disk for later replay."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, url: str, params: Dict[str, Any], body: Any):
+        """Store one response, keyed by request path and query."""
+        path = urlsplit(url).path
+        key = capture_key(path, params)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        target = os.path.join(self.directory, f"{digest}.json")
+        tmp_path = f"{target}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'path': path, 'key': key, 'body': body}, f)
+            os.replace(tmp_path, target)
+        except OSError as e:
+            print(f"Error recording Reddit response: {e}")
+
+
+class CaptureStore:
+    """In-memory index of recorded responses."""
+
+    def __init__(self, directory: str):
+        self.by_key: Dict[str, bytes] = {}
+        self.by_path: Dict[str, bytes] = {}
+
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                capture = json.load(f)
+            body = json.dumps(capture['body']).encode('utf-8')
+            self.by_key[capture['key']] = body
+            self.by_path.setdefault(capture['path'], body)
+
+    def lookup(self, request_path: str) -> Optional[bytes]:
+        """Find the capture for a request, falling back to any capture of the same path."""
+        parts = urlsplit(request_path)
+        key = capture_key(parts.path, dict(parse_qsl(parts.query)))
+        return self.by_key.get(key) or self.by_path.get(parts.path)
+
+    def __len__(self):
+        return len(self.by_key)
+
+
+class RateLimitWindow:
+    """Emulates Reddit's fixed-window request budget and X-Ratelimit headers."""
+
+    def __init__(self, budget: int, window: float):
+        self.budget = budget
+        self.window = window
+        self.window_start = time.monotonic()
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> Tuple[bool, Dict[str, str]]:
+        """Count one request; returns whether it is allowed and the headers to send."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used = 0
+            reset = max(self.window - (now - self.window_start), 0)
+            allowed = self.used < self.budget
+            if allowed:
+                self.used += 1
+            headers = {
+                'X-Ratelimit-Used': str(self.used),
+                'X-Ratelimit-Remaining': str(self.budget - self.used),
+                'X-Ratelimit-Reset': str(int(reset)),
+            }
+            if not allowed:
+                headers['Retry-After'] = str(int(reset) + 1)
+            return allowed, headers
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Local stand-in for reddit.com that serves recorded captures."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], captures: CaptureStore,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[RateLimitWindow] = None, seed: Optional[int] = None):
+        super().__init__(address, ReplayHandler)
+        self.captures = captures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def sample_delay(self) -> float:
+        with self._random_lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def sample_error(self) -> bool:
+        with self._random_lock:
+            return self.random.random() < self.error_rate
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Serves one request from the capture store."""
+
+    server: ReplayServer
+
+    def do_GET(self):
+        time.sleep(self.server.sample_delay())
+
+        headers = {}
+        if self.server.rate_limit:
+            allowed, headers = self.server.rate_limit.take()
+            if not allowed:
+                self._send(429, b'{"message": "Too Many Requests", "error": 429}', headers)
+                return
+
+        if self.server.sample_error():
+            self._send(503, b'{"message": "Service Unavailable", "error": 503}', headers)
+            return
+
+        body = self.server.captures.lookup(self.path)
+        if body is None:
+            self._send(404, b'{"message": "Not Found", "error": 404}', headers)
+            return
+        self._send(200, body, headers)
+
+    def _send(self, status: int, body: bytes, headers: Dict[str, str]):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Reddit responses locally.")
+    parser.add_argument('--captures', required=True, help="Directory written by REDDIT_RECORD_DIR")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Base response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--ratelimit-budget', type=int, default=0, help="Requests per window; 0 disables")
+    parser.add_argument('--ratelimit-window', type=float, default=600.0, help="Rate-limit window in seconds")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    captures = CaptureStore(args.captures)
+    rate_limit = RateLimitWindow(args.ratelimit_budget, args.ratelimit_window) if args.ratelimit_budget else None
+    server = ReplayServer(
+        (args.host, args.port), captures,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit=rate_limit, seed=args.seed
+    )
+    print(f"Replaying {len(captures)} captures on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
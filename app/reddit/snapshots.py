@@ -0,0 +1,104 @@
+import time
+from typing import Dict, List
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models import ScoreSnapshot, chunked
+
+
+class SnapshotStore:
+    """
+    Append-only score history used to measure how fast posts are gaining
+    upvotes right now, rather than averaged over their whole lifetime.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.settings = get_settings()
+
+    def _latest_timestamps(self, post_ids: List[str]) -> Dict[str, int]:
+        latest = {}
+        for chunk in chunked(post_ids):
+            rows = self.db.execute(
+                select(ScoreSnapshot.post_id, func.max(ScoreSnapshot.ts))
+                .where(ScoreSnapshot.post_id.in_(chunk))
+                .group_by(ScoreSnapshot.post_id)
+            )
+            latest.update((post_id, ts) for post_id, ts in rows)
+        return latest
+
+    def record(self, posts: List, now: float = None):
+        """
+        Append a snapshot for each post, skipping posts sampled within the
+        snapshot interval. Does not commit.
+        """
+        if not posts:
+            return
+
+        ts = int(now or time.time())
+        min_gap = self.settings.snapshot_interval_minutes * 60
+        latest = self._latest_timestamps(list({post.id for post in posts}))
+
+        rows = {}
+        for post in posts:
+            if ts - latest.get(post.id, 0) >= min_gap:
+                rows[post.id] = {
+                    'post_id': post.id,
+                    'ts': ts,
+                    'score': post.score,
+                    'num_comments': post.num_comments,
+                }
+        if rows:
+            self.db.execute(insert(ScoreSnapshot), list(rows.values()))
+
+    def compact(self, now: float = None):
+        """
+        Apply retention and downsampling: drop snapshots past retention and
+        keep one per post per hour beyond the full-resolution window.
+        """
+        now = now or time.time()
+        retention_cutoff = int(now - self.settings.snapshot_retention_hours * 3600)
+        thin_cutoff = int(now - self.settings.snapshot_full_resolution_hours * 3600)
+
+        self.db.execute(delete(ScoreSnapshot).where(ScoreSnapshot.ts < retention_cutoff))
+
+        keep = (
+            select(func.min(ScoreSnapshot.id))
+            .where(ScoreSnapshot.ts < thin_cutoff)
+            .group_by(ScoreSnapshot.post_id, ScoreSnapshot.ts // 3600)
+        )
+        self.db.execute(
+            delete(ScoreSnapshot)
+            .where(ScoreSnapshot.ts < thin_cutoff)
+            .where(ScoreSnapshot.id.not_in(keep))
+        )
+        self.db.commit()
+
+    def windowed_velocities(self, posts: List, now: float = None) -> Dict[str, float]:
+        """
+        Upvotes per hour over the velocity window, keyed by post ID.
+        Compares each post's current score with its earliest snapshot in the
+        window; posts without a long enough history are left out.
+        """
+        now = now or time.time()
+        since = int(now - self.settings.velocity_window_hours * 3600)
+        min_span = self.settings.velocity_min_span_minutes * 60
+        current = {post.id: post.score for post in posts}
+        post_ids = list(current)
+
+        earliest = {}
+        for chunk in chunked(post_ids):
+            rows = self.db.execute(
+                select(ScoreSnapshot.post_id, ScoreSnapshot.ts, ScoreSnapshot.score)
+                .where(ScoreSnapshot.post_id.in_(chunk), ScoreSnapshot.ts >= since)
+                .order_by(ScoreSnapshot.post_id, ScoreSnapshot.ts)
+            )
+            for post_id, ts, score in rows:
+                earliest.setdefault(post_id, (ts, score))
+
+        velocities = {}
+        for post_id, (ts, score) in earliest.items():
+            span = now - ts
+            if span >= min_span:
+                velocities[post_id] = max(current[post_id] - score, 0) / (span / 3600)
+        return velocities
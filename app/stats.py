@@ -0,0 +1,18 @@
+import threading
+from typing import Dict, Iterable
+
+
+class Counters:
+    """Thread-safe named counters, shared by the Reddit client and the summary cache."""
+
+    def __init__(self, fields: Iterable[str]):
+        self._lock = threading.Lock()
+        self._counts = {field: 0 for field in fields}
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,93 @@
+"""
+Fetch-path throughput against the local Reddit stand-in server.
+
+Serves synthetic captures (or a recorded directory) through
+app.reddit.replay and times listing fetches at several concurrency levels.
+
+Usage:
+    python -m benchmarks.bench_fetch --subreddits 40 --latency 0.2
+    python -m benchmarks.bench_fetch --captures ./captures
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import get_settings
+from app.reddit.client import TokenBucket
+from app.reddit.fetcher import RedditFetcher
+from app.reddit.replay import CaptureStore, ReplayServer, ResponseRecorder
+from benchmarks.synthetic import make_payloads
+
+
+def write_synthetic_captures(directory: str, subreddits: int, posts_per_subreddit: int):
+    """Record one hot listing per synthetic subreddit."""
+    recorder = ResponseRecorder(directory)
+    payloads = make_payloads(subreddits * posts_per_subreddit, subreddits=subreddits)
+    by_subreddit = {}
+    for payload in payloads:
+        by_subreddit.setdefault(payload['subreddit'], []).append({'kind': 't3', 'data': payload})
+    for name, children in by_subreddit.items():
+        recorder.record(
+            f"https://www.reddit.com/r/{name}/hot.json", {'limit': 100},
+            {'kind': 'Listing', 'data': {'after': None, 'children': children[:100]}}
+        )
+    return sorted(by_subreddit)
+
+
+def run(base_url: str, names, concurrency: int, rate: float) -> float:
+    fetcher = RedditFetcher(db=None, concurrency=concurrency)
+    fetcher.client.base_url = base_url
+    fetcher.client.cache = None
+    fetcher.client.rate_limiter = TokenBucket(rate, concurrency)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda name: fetcher._fetch_listing(name, 0), names))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--captures', help="Recorded capture directory (default: synthetic)")
+    parser.add_argument('--subreddits', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate', type=float, default=50.0, help="Token bucket requests/second")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.captures:
+            directory = args.captures
+            store = CaptureStore(directory)
+            names = sorted({path.split('/')[2] for path in store.by_path if path.startswith('/r/')})
+        else:
+            directory = tmp
+            names = write_synthetic_captures(directory, args.subreddits, 100)
+            store = CaptureStore(directory)
+
+        # Keep the client's retry backoff short relative to the simulated latency
+        os.environ.setdefault('REDDIT_BACKOFF_BASE_SECONDS', '0.1')
+        get_settings.cache_clear()
+
+        server = ReplayServer(('127.0.0.1', 0), store, latency=args.latency,
+                              jitter=args.jitter, error_rate=args.error_rate, seed=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        try:
+            for concurrency in args.concurrency:
+                seconds = run(base_url, names, concurrency, args.rate)
+                print(f"concurrency {concurrency:>2}: {len(names)} subreddits in {seconds:6.2f}s "
+                      f"({len(names) / seconds:6.1f} listings/s)")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
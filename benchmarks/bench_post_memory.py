@@ -0,0 +1,78 @@
+"""
+Compare the old dict-backed RedditPost wrapper with the slotted RedditPost.
+
+Reports retained memory per candidate and PostRanker.rank_posts time.
+
+The legacy ranking run is capped with --legacy-rank-candidates because the
+per-access class construction makes it impractically slow at 10k.
+
+Usage:
+    python -m benchmarks.bench_post_memory --candidates 10000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from app.reddit.client import RedditPost
+from app.reddit.ranking import PostRanker
+from benchmarks.synthetic import make_payloads
+
+
+class LegacyRedditPost:
+    """The previous wrapper: keeps the raw payload and rebuilds subreddit on access."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        if name == 'subreddit':
+            class Subreddit:
+                def __init__(self, name):
+                    self.display_name = name
+            return Subreddit(self._data.get('subreddit', ''))
+        return self._data.get(name)
+
+
+def measure_memory(cls, count: int) -> float:
+    """Bytes retained per candidate once the listing JSON has been dropped."""
+    gc.collect()
+    tracemalloc.start()
+    payloads = make_payloads(count)
+    posts = [cls(payload) for payload in payloads]
+    del payloads
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del posts
+    return retained / count
+
+
+def measure_ranking(cls, count: int) -> float:
+    """Seconds spent in PostRanker.rank_posts."""
+    posts = [cls(payload) for payload in make_payloads(count)]
+    ranker = PostRanker()
+    start = time.perf_counter()
+    ranker.rank_posts(posts)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--candidates', type=int, default=10000)
+    parser.add_argument('--legacy-rank-candidates', type=int, default=1000)
+    args = parser.parse_args()
+
+    runs = (
+        ('legacy', LegacyRedditPost, min(args.candidates, args.legacy_rank_candidates)),
+        ('slotted', RedditPost, args.candidates),
+    )
+    for label, cls, rank_count in runs:
+        per_post = measure_memory(cls, args.candidates)
+        seconds = measure_ranking(cls, rank_count)
+        print(f"{label:>8}: {per_post / 1024:7.2f} KiB/candidate, "
+              f"rank_posts({rank_count}) {seconds:7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Batch ranking (PostRanker.rank_batch) against the per-post rank_post loop.
+
+Checks that both produce identical scores and times them at several
+candidate counts. The per-post loop is O(n^2 log n) and is skipped above
+--legacy-max candidates.
+
+Usage:
+    python -m benchmarks.bench_ranking --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+from app.reddit.client import RedditPost
+from app.reddit.ranking import PostRanker
+from benchmarks.synthetic import make_payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=10000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        posts = [RedditPost(payload) for payload in make_payloads(size)]
+        ranker = PostRanker()
+
+        start = time.perf_counter()
+        batch_scores = ranker.rank_batch(posts)
+        batch_seconds = time.perf_counter() - start
+
+        line = f"{size:>7} candidates: batch {batch_seconds:8.3f}s"
+        if size <= args.legacy_max:
+            start = time.perf_counter()
+            legacy_scores = [ranker.rank_post(post, posts) for post in posts]
+            legacy_seconds = time.perf_counter() - start
+            assert legacy_scores == batch_scores, "batch scores differ from rank_post"
+            line += f", per-post {legacy_seconds:8.3f}s ({legacy_seconds / batch_seconds:,.0f}x), scores identical"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Digest email rendering: the precompiled Jinja2 templates (minified and
+not) against the previous f-string concatenation.
+
+Reports render time, HTML size and whether the email stays under Gmail's
+~102KB clipping limit.
+
+Usage:
+    python -m benchmarks.bench_render --sizes 12 100 1000 --repeat 20
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from app.email.templates import GMAIL_CLIP_BYTES, generate_digest_html
+from app.models import DigestPost
+
+
+def make_digest_posts(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    words = ("reddit python release performance update community discussion "
+             "benchmark library feature data model open source <script> & \"quotes\"").split()
+    return [
+        DigestPost(
+            post_id=f"p{i}",
+            subreddit=f"sub{i % 40}",
+            title=" ".join(rng.choice(words) for _ in range(rng.randint(6, 14))),
+            url=f"https://reddit.com/r/sub{i % 40}/comments/p{i}/post/",
+            score=rng.randint(10, 50000),
+            num_comments=rng.randint(0, 5000),
+            summary=" ".join(rng.choice(words) for _ in range(rng.randint(35, 60))),
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_digest_html(posts) -> str:
+    """The previous renderer's post loop and wrapper, without escaping."""
+    posts_html = ""
+    for post in posts:
+        posts_html += f"""
+        <div style="margin-bottom: 30px; padding-bottom: 30px; border-bottom: 1px solid #e5e7eb;">
+            <div style="display: flex; align-items: center; margin-bottom: 8px;">
+                <span style="background: #3b82f6; color: white; padding: 2px 8px; border-radius: 4px; font-size: 12px; font-weight: 500; margin-right: 8px;">
+                    r/{post.subreddit}
+                </span>
+                <span style="color: #6b7280; font-size: 12px;">
+                    {post.score} upvotes • {post.num_comments} comments
+                </span>
+            </div>
+            <h3 style="margin: 8px 0; font-size: 18px; line-height: 1.4;">
+                <a href="{post.url}" style="color: #111827; text-decoration: none;">
+                    {post.title}
+                </a>
+            </h3>
+            <p style="color: #4b5563; font-size: 14px; line-height: 1.6; margin: 8px 0 0 0;">
+                {post.summary}
+            </p>
+        </div>
+        """
+    return f"""
+    <!DOCTYPE html>
+    <html lang="en">
+    <body>
+        <div style="margin-top: 30px;">
+            {posts_html}
+        </div>
+    </body>
+    </html>
+    """
+
+
+def measure(render, posts, repeat: int):
+    # The renderer's clipping warning is reported in the table instead
+    with contextlib.redirect_stdout(io.StringIO()):
+        html = render(posts)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            render(posts)
+        elapsed = time.perf_counter() - start
+    return elapsed / repeat, len(html.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    renderers = [
+        ('legacy f-string', legacy_digest_html),
+        ('jinja2', lambda posts: generate_digest_html(posts, minify=False)),
+        ('jinja2 minified', lambda posts: generate_digest_html(posts, minify=True)),
+    ]
+
+    print(f"{'posts':>6}  {'renderer':<16} {'ms':>9} {'KB':>9}  gmail")
+    for size in args.sizes:
+        posts = make_digest_posts(size)
+        for name, render in renderers:
+            seconds, size_bytes = measure(render, posts, args.repeat)
+            clipped = "clipped" if size_bytes > GMAIL_CLIP_BYTES else "ok"
+            print(f"{size:>6}  {name:<16} {seconds * 1000:>9.2f} {size_bytes / 1024:>9.1f}  {clipped}")
+
+
+if __name__ == '__main__':
+    main()
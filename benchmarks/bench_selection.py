@@ -0,0 +1,59 @@
+"""
+Lazy top-k selection (PostRanker.select_top_posts) against ranking every
+candidate into a RankedPost and then calling select_diverse_posts.
+
+Checks that both pick the same posts and reports time, peak traced memory
+and the number of RankedPost objects built.
+
+Usage:
+    python -m benchmarks.bench_selection --sizes 1000 10000 100000 --count 12
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.reddit.client import RedditPost
+from app.reddit.ranking import PostRanker
+from benchmarks.synthetic import make_payloads
+
+
+def eager(ranker: PostRanker, posts, count):
+    ranked = ranker.rank_posts(posts)
+    return ranked, ranker.select_diverse_posts(ranked, count)
+
+
+def lazy(ranker: PostRanker, posts, count):
+    selected = ranker.select_top_posts(posts, count)
+    return selected, selected
+
+
+def measure(fn, ranker, posts, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    built, selected = fn(ranker, posts, count)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, len(built), [post.post_id for post in selected]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--count', type=int, default=12)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        posts = [RedditPost(payload) for payload in make_payloads(size)]
+        ranker = PostRanker()
+        results = {}
+        for label, fn in (('eager', eager), ('lazy', lazy)):
+            results[label] = measure(fn, ranker, posts, args.count)
+            seconds, peak, built, _ = results[label]
+            print(f"{size:>7} candidates {label:>5}: {seconds:7.3f}s, "
+                  f"peak {peak / 1024 / 1024:7.2f} MiB, {built:>7} RankedPost built")
+        assert results['eager'][3] == results['lazy'][3], "selections differ"
+
+
+if __name__ == '__main__':
+    main()
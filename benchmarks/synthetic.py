@@ -0,0 +1,39 @@
+"""Synthetic Reddit listing payloads for offline benchmarks."""
+import random
+import time
+from typing import Any, Dict, List
+
+# Filler keys so each payload is roughly the size of a real listing child
+_FILLER_FIELDS = [f"field_{i}" for i in range(90)]
+
+
+def make_post_payload(index: int, subreddit: str, rng: random.Random) -> Dict[str, Any]:
+    """Build one post `data` dict shaped like Reddit's listing JSON."""
+    is_self = rng.random() < 0.4
+    score = int(rng.paretovariate(1.2) * 20)
+    payload = {
+        'id': f"p{index:07d}",
+        'title': f"Post number {index} about something interesting in r/{subreddit}",
+        'score': score,
+        'num_comments': int(score * rng.uniform(0.01, 0.3)),
+        'upvote_ratio': round(rng.uniform(0.6, 1.0), 2),
+        'created_utc': time.time() - rng.uniform(600, 86400),
+        'permalink': f"/r/{subreddit}/comments/p{index:07d}/post_number_{index}/",
+        'url': f"https://example.com/{index}",
+        'is_self': is_self,
+        'selftext': ("Lorem ipsum dolor sit amet. " * rng.randint(0, 40)) if is_self else '',
+        'subreddit': subreddit,
+        'media': {'oembed': {'html': '<iframe></iframe>' * 20, 'width': 600, 'height': 400}},
+        'preview': {'images': [{'source': {'url': f"https://i.example.com/{index}.jpg"},
+                                'resolutions': [{'width': w, 'height': w} for w in (108, 216, 320, 640)]}]},
+    }
+    for key in _FILLER_FIELDS:
+        payload[key] = None if rng.random() < 0.5 else f"{key}-{index}"
+    return payload
+
+
+def make_payloads(count: int, subreddits: int = 40, seed: int = 1) -> List[Dict[str, Any]]:
+    """Build `count` post payloads spread across `subreddits` subreddits."""
+    rng = random.Random(seed)
+    names = [f"sub{i}" for i in range(subreddits)]
+    return [make_post_payload(i, rng.choice(names), rng) for i in range(count)]